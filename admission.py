@@ -0,0 +1,138 @@
+# admission.py
+import asyncio
+import math
+import os
+import time
+import discord
+from discord import app_commands
+from dotenv import load_dotenv
+from tracing import tracer
+
+load_dotenv()
+
+# Per-user and per-guild limits for commands that spend API budget or hold
+# pool connections, as "runs/seconds". Override with e.g.
+# ADMISSION_LEADERBOARD_USER=1/30 or ADMISSION_LEADERBOARD_GUILD=5/60
+DEFAULT_LIMITS = {
+    'leaderboard': ('2/60', '6/60'),
+    'squad_stats': ('3/60', '10/60'),
+    'stats': ('5/60', '30/60'),
+    'me': ('5/60', '30/60'),
+}
+
+# Forget idle buckets once this many are tracked
+MAX_BUCKETS = 10000
+
+def parse_limit(limit: str):
+    """Turn 'runs/seconds' into (capacity, tokens per second)"""
+    runs, seconds = limit.split('/')
+    return int(runs), int(runs) / float(seconds)
+
+def load_limits():
+    limits = {}
+    for command, (user_limit, guild_limit) in DEFAULT_LIMITS.items():
+        prefix = f'ADMISSION_{command.upper()}'
+        limits[command] = (
+            parse_limit(os.getenv(f'{prefix}_USER', user_limit)),
+            parse_limit(os.getenv(f'{prefix}_GUILD', guild_limit)),
+        )
+    return limits
+
+class TokenBucket:
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self):
+        """Seconds until a token is available (0 if one is available now)"""
+        self.refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    @property
+    def idle(self):
+        self.refill()
+        return self.tokens >= self.capacity
+
+class AdmissionControl:
+    """Token-bucket cooldowns plus sharing of identical in-flight work"""
+    def __init__(self):
+        self.limits = load_limits()
+        self.buckets = {}
+        self.in_flight = {}
+
+    def bucket(self, key, capacity: int, rate: float):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_BUCKETS:
+                self.buckets = {k: b for k, b in self.buckets.items() if not b.idle}
+            bucket = self.buckets[key] = TokenBucket(capacity, rate)
+        return bucket
+
+    def admit(self, command: str, user_id: int, guild_id: int = None):
+        """Take a token for this run, or return how many seconds to wait"""
+        if command not in self.limits:
+            return 0
+
+        (user_capacity, user_rate), (guild_capacity, guild_rate) = self.limits[command]
+        buckets = [self.bucket(('user', user_id, command), user_capacity, user_rate)]
+        if guild_id is not None:
+            buckets.append(self.bucket(('guild', guild_id, command), guild_capacity, guild_rate))
+
+        # Only spend tokens if every bucket allows the run
+        retry_after = max(bucket.retry_after() for bucket in buckets)
+        if retry_after:
+            return retry_after
+        for bucket in buckets:
+            bucket.take()
+        return 0
+
+    async def share(self, key, coro_factory):
+        """Run coro_factory() once per key; concurrent callers await the same result"""
+        task = self.in_flight.get(key)
+        joined = task is not None
+        if task is None:
+            # The shared run's spans land in the trace of whoever started it
+            task = asyncio.ensure_future(coro_factory())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # A cancelled waiter must not cancel the run other callers are sharing
+        with tracer.span('admission.share', joined=joined):
+            return await asyncio.shield(task)
+
+class AdmissionCommandTree(app_commands.CommandTree):
+    """Command tree that applies cooldowns before running commands"""
+    async def _call(self, interaction: discord.Interaction):
+        # Every command invocation is the root of its own trace
+        if not tracer.enabled or interaction.type != discord.InteractionType.application_command:
+            return await super()._call(interaction)
+        command = interaction.command.qualified_name if interaction.command else interaction.data.get('name')
+        with tracer.trace(f"/{command}", command=command, interaction_id=interaction.id):
+            return await super()._call(interaction)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.type != discord.InteractionType.application_command or interaction.command is None:
+            return True
+
+        guild_id = interaction.guild.id if interaction.guild else None
+        retry_after = admission.admit(interaction.command.qualified_name, interaction.user.id, guild_id)
+        if retry_after:
+            await interaction.response.send_message(
+                f"Slow down! Try `/{interaction.command.qualified_name}` again in {math.ceil(retry_after)}s.",
+                ephemeral=True
+            )
+            return False
+        return True
+
+admission = AdmissionControl()
@@ -0,0 +1,46 @@
+# card_render.py
+"""Stat card drawing, run in the card worker processes.
+
+Only Pillow is imported here so workers don't load the Discord client,
+database pool or anything else just to draw.
+"""
+import io
+from PIL import Image, ImageDraw, ImageFont
+
+# Bump whenever the layout below changes so old cached cards aren't reused
+TEMPLATE_VERSION = 2
+
+WIDTH = 900
+PADDING = 32
+COLUMNS = 3
+CELL_HEIGHT = 96
+HEADER_HEIGHT = 120
+
+def render_card(card: dict):
+    """Draw a stat card and return it as PNG bytes (runs in a worker process)"""
+    rows = (len(card['fields']) + COLUMNS - 1) // COLUMNS
+    height = HEADER_HEIGHT + rows * CELL_HEIGHT + PADDING * 2
+    image = Image.new('RGB', (WIDTH, height), (30, 31, 36))
+    draw = ImageDraw.Draw(image)
+
+    title_font = ImageFont.load_default(40)
+    text_font = ImageFont.load_default(20)
+    value_font = ImageFont.load_default(34)
+
+    # Header band in the embed's color
+    draw.rectangle((0, 0, WIDTH, 8), fill=card['color'])
+    draw.text((PADDING, 28), card['title'], font=title_font, fill=(255, 255, 255))
+    if card['description']:
+        draw.text((PADDING, 80), card['description'], font=text_font, fill=(170, 172, 180))
+
+    cell_width = (WIDTH - PADDING * 2) // COLUMNS
+    for i, (name, value) in enumerate(card['fields']):
+        x = PADDING + (i % COLUMNS) * cell_width
+        y = HEADER_HEIGHT + PADDING + (i // COLUMNS) * CELL_HEIGHT
+        draw.rounded_rectangle((x, y, x + cell_width - 12, y + CELL_HEIGHT - 12), radius=10, fill=(43, 45, 52))
+        draw.text((x + 16, y + 10), name.upper(), font=text_font, fill=(150, 152, 160))
+        draw.text((x + 16, y + 38), value, font=value_font, fill=(255, 255, 255))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
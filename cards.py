@@ -0,0 +1,127 @@
+# cards.py
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import discord
+from dotenv import load_dotenv
+from card_render import render_card, TEMPLATE_VERSION
+from tracing import traced
+
+load_dotenv()
+
+# Worker processes rendering cards; rendering is CPU-bound so it never runs on the event loop
+CARD_WORKERS = int(os.getenv('CARD_WORKERS', '2'))
+# Rendered PNGs kept in memory, keyed by a hash of their content
+CARD_CACHE_SIZE = int(os.getenv('CARD_CACHE_SIZE', '200'))
+
+def strip_markdown(text: str):
+    """Plain text for the card: no markdown, and no emoji the card font can't draw"""
+    text = re.sub(r'[*_`~]', '', text or '')
+    return ''.join(ch for ch in text if ord(ch) < 0x2000).strip()
+
+def card_from_embed(embed: discord.Embed):
+    """The parts of a stats embed that go on its card, as plain picklable data.
+
+    The footer stays on the embed: it carries the age of stale stats, which
+    would make every minute a new card.
+    """
+    color = embed.color.to_rgb() if embed.color else (88, 101, 242)
+    return {
+        'title': strip_markdown(embed.title),
+        'description': strip_markdown(embed.description),
+        'fields': [(strip_markdown(field.name), strip_markdown(field.value)) for field in embed.fields],
+        'color': color,
+    }
+
+def card_key(card: dict):
+    """Content address of a card: same stats and template, same PNG"""
+    payload = json.dumps([TEMPLATE_VERSION, card], sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+class CardRenderer:
+    """Renders stat cards in a bounded process pool and caches the PNGs by content"""
+    def __init__(self, workers: int = CARD_WORKERS, cache_size: int = CARD_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.executor = None
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.hits = 0
+        self.renders = 0
+
+    def get_executor(self):
+        if self.executor is None:
+            # Spawned workers don't inherit the bot's threads, sockets or event loop.
+            # They do re-import main.py as __mp_main__ (its client.run is behind the
+            # __main__ guard), so each worker carries a copy of the bot's modules
+            # in memory; render_card itself only needs Pillow.
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self.executor
+
+    def reset_executor(self, executor: ProcessPoolExecutor):
+        """Drop a pool whose worker died; the next render starts a new one"""
+        if self.executor is executor:
+            self.executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, card: dict):
+        """Start rendering a card; returns the future and the pool running it"""
+        loop = asyncio.get_running_loop()
+        executor = self.get_executor()
+        try:
+            return loop.run_in_executor(executor, render_card, card), executor
+        except BrokenProcessPool:
+            self.reset_executor(executor)
+            executor = self.get_executor()
+            return loop.run_in_executor(executor, render_card, card), executor
+
+    @traced('cards')
+    async def render(self, card: dict):
+        """PNG bytes for a card, from the cache when an identical card was rendered before"""
+        key = card_key(card)
+        png = self.cache.get(key)
+        if png is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return png
+
+        # Identical cards requested at the same time share one render
+        pending = self.in_flight.get(key)
+        if pending is None:
+            pending = self.in_flight[key] = self.submit(card)
+            self.renders += 1
+        future, executor = pending
+        try:
+            png = await asyncio.shield(future)
+        except BrokenProcessPool:
+            # One dead worker breaks the whole pool for good, so replace it
+            self.reset_executor(executor)
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+        self.cache[key] = png
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return png
+
+    def is_cached(self, card: dict):
+        return card_key(card) in self.cache
+
+def attach_card(embed: discord.Embed, png: bytes, filename: str = 'stats.png'):
+    """Swap an embed's stat fields for its rendered card; returns the file to send with it"""
+    embed.clear_fields()
+    embed.set_image(url=f"attachment://{filename}")
+    return discord.File(io.BytesIO(png), filename=filename)
+
+card_renderer = CardRenderer()
@@ -0,0 +1,87 @@
+# command_trace.py
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+import discord
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Append anonymized app-command invocations to this JSONL file (off when unset)
+TRACE_FILE = os.getenv('COMMAND_TRACE_FILE')
+# Key for the anonymizing hashes. Random per run unless set, so traces from
+# different runs can't be linked to each other.
+TRACE_SALT = os.getenv('COMMAND_TRACE_SALT') or secrets.token_hex(16)
+
+# Parameters that name a player or squad are replaced with stable pseudonyms
+PSEUDONYM_PREFIXES = {
+    'username': 'player',
+    'epic_username': 'player',
+    'new_epic_username': 'player',
+    'squad_name': 'squad',
+}
+
+# Discord option types for subcommands, subcommand groups and attachments
+SUB_COMMAND = 1
+SUB_COMMAND_GROUP = 2
+ATTACHMENT = 11
+
+def pseudonym(value) -> str:
+    return hmac.new(TRACE_SALT.encode(), str(value).lower().encode(), hashlib.blake2b).hexdigest()[:12]
+
+def anonymous_id(value: int) -> int:
+    """Stable fake snowflake for a user or guild ID"""
+    return int(pseudonym(value), 16) & ((1 << 62) - 1)
+
+def parse_options(options: list, path: list, params: dict):
+    """Walk raw interaction options into a command path and its parameters"""
+    for option in options or []:
+        if option['type'] in (SUB_COMMAND, SUB_COMMAND_GROUP):
+            path.append(option['name'])
+            parse_options(option.get('options'), path, params)
+        elif option['type'] == ATTACHMENT:
+            params[option['name']] = None
+        elif option['name'] in PSEUDONYM_PREFIXES:
+            params[option['name']] = f"{PSEUDONYM_PREFIXES[option['name']]}_{pseudonym(option['value'])}"
+        else:
+            params[option['name']] = option.get('value')
+
+class CommandRecorder:
+    """Writes one JSON line per app-command invocation, with IDs and names anonymized"""
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self.file = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def record(self, interaction: discord.Interaction):
+        if not self.enabled or interaction.type != discord.InteractionType.application_command:
+            return
+
+        data = interaction.data or {}
+        path = [data.get('name')]
+        params = {}
+        parse_options(data.get('options'), path, params)
+        event = {
+            'ts': time.time(),
+            'command': ' '.join(path),
+            'params': params,
+            'user': anonymous_id(interaction.user.id),
+            'guild': anonymous_id(interaction.guild_id) if interaction.guild_id else None,
+        }
+
+        try:
+            if self.file is None:
+                # Line buffered so a crash loses at most the line being written
+                self.file = open(self.path, 'a', buffering=1, encoding='utf-8')
+            self.file.write(json.dumps(event) + '\n')
+        except OSError as e:
+            print(f"Failed to record command trace: {e}")
+            self.path = None
+
+command_recorder = CommandRecorder()
@@ -0,0 +1,141 @@
+# fortnite_api.py
+import aiohttp
+import asyncio
+import os
+import time
+from collections import deque
+from dotenv import load_dotenv
+from tracing import tracer, traced, http_trace_config
+
+load_dotenv()
+
+# Overridable so replay.py can point the bot at a local fake API
+STATS_URL = os.getenv('FORTNITE_API_URL', "https://fortnite-api.com/v2/stats/br/v2")
+API_KEY = os.getenv('FORTNITE_API_KEY')
+
+# Fortnite-API.com allows 1000 requests/hour with a key
+HOURLY_BUDGET = int(os.getenv('FORTNITE_API_HOURLY_BUDGET', '1000'))
+# Share of the hourly budget that background work must leave for commands
+INTERACTIVE_RESERVE = float(os.getenv('FORTNITE_API_INTERACTIVE_RESERVE', '0.3'))
+
+# Consecutive 5xx/network failures before the bot switches to degraded mode
+ERROR_THRESHOLD = int(os.getenv('FORTNITE_API_ERROR_THRESHOLD', '3'))
+# How long degraded mode lasts after errors, unless upstream says otherwise (seconds)
+ERROR_BACKOFF = int(os.getenv('FORTNITE_API_ERROR_BACKOFF', '60'))
+
+PRIORITY_HIGH = 0  # user-facing commands
+PRIORITY_LOW = 1   # background prefetching
+
+
+class FortniteAPI:
+    def __init__(self):
+        self.session = None
+        self.calls = deque()  # timestamps of requests made in the last hour
+        self.consecutive_errors = 0
+        self.degraded_until = 0
+        self.degraded_reason = None
+
+    def remaining_budget(self):
+        """Requests left in the rolling one-hour window"""
+        cutoff = time.monotonic() - 3600
+        while self.calls and self.calls[0] < cutoff:
+            self.calls.popleft()
+        return HOURLY_BUDGET - len(self.calls)
+
+    def has_spare_budget(self):
+        """Whether background work can spend a request without eating into the command reserve"""
+        return not self.is_degraded and self.remaining_budget() > HOURLY_BUDGET * INTERACTIVE_RESERVE
+
+    @property
+    def is_degraded(self):
+        """True while the budget is spent or upstream is failing; commands serve cached stats"""
+        return time.monotonic() < self.degraded_until
+
+    def enter_degraded(self, reason: str, duration: float):
+        if not self.is_degraded:
+            print(f"Fortnite API degraded ({reason}), serving cached stats for {duration:.0f}s")
+        self.degraded_until = max(self.degraded_until, time.monotonic() + duration)
+        self.degraded_reason = reason
+
+    def record_success(self):
+        self.consecutive_errors = 0
+        if self.degraded_reason is not None:
+            print("Fortnite API recovered, leaving degraded mode")
+            self.degraded_reason = None
+
+    def record_error(self, reason: str):
+        self.consecutive_errors += 1
+        if self.consecutive_errors >= ERROR_THRESHOLD:
+            self.enter_degraded(reason, ERROR_BACKOFF)
+
+    def status(self):
+        """Snapshot of the client's health for logs and /debug status"""
+        degraded = self.is_degraded
+        return {
+            'degraded': degraded,
+            'reason': self.degraded_reason if degraded else None,
+            'retry_in': max(0, self.degraded_until - time.monotonic()),
+            'remaining_budget': self.remaining_budget(),
+            'hourly_budget': HOURLY_BUDGET,
+        }
+
+    async def get_session(self):
+        """Shared HTTP session so requests reuse open connections"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10),
+                trace_configs=[http_trace_config()] if tracer.enabled else None
+            )
+        return self.session
+
+    @traced('api')
+    async def fetch_stats(self, username: str, time_window: str = 'lifetime', priority: int = PRIORITY_HIGH):
+        """Get a player's stats payload for a time window ('lifetime' or 'season'), or None if unavailable"""
+        if self.is_degraded:
+            return None
+        if priority == PRIORITY_LOW and not self.has_spare_budget():
+            return None
+        if self.remaining_budget() <= 0:
+            # Degraded until the oldest request leaves the one-hour window
+            self.enter_degraded('hourly budget exhausted', self.calls[0] + 3600 - time.monotonic())
+            return None
+
+        session = await self.get_session()
+        headers = {'Authorization': API_KEY} if API_KEY else {}
+        params = {
+            'name': username,
+            'accountType': 'epic',
+            'timeWindow': time_window,
+        }
+
+        self.calls.append(time.monotonic())
+        try:
+            async with session.get(STATS_URL, params=params, headers=headers) as response:
+                if response.status == 429:
+                    retry_after = response.headers.get('Retry-After', '')
+                    self.enter_degraded('rate limited', int(retry_after) if retry_after.isdigit() else ERROR_BACKOFF)
+                    return None
+                if response.status >= 500:
+                    self.record_error(f"upstream error {response.status}")
+                    return None
+                # Anything else (e.g. 404 for unknown or private players) means upstream is healthy
+                self.record_success()
+                if response.status != 200:
+                    return None
+                data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Stats request for {username} failed: {e!r}")
+            self.record_error('upstream unreachable')
+            return None
+
+        if data.get('status') != 200:
+            return None
+
+        # Only keep the parts the bot uses (drops per-input breakdowns)
+        stats_data = data.get('data', {})
+        return {
+            'account': stats_data.get('account', {}),
+            'stats': {'all': stats_data.get('stats', {}).get('all', {})},
+        }
+
+api = FortniteAPI()
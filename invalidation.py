@@ -0,0 +1,48 @@
+# invalidation.py
+import asyncio
+
+class InvalidationBus:
+    """Tells everything derived from registrations that one changed.
+
+    Handlers run synchronously, in subscription order, so in-memory state is
+    consistent before the command replies. They get a list of changes, so a
+    bulk import is one call that can be handled in bulk. A handler may return
+    a coroutine for follow-up work (database cleanup, account lookups), which
+    runs as a background task.
+    """
+    def __init__(self):
+        self.handlers = []
+        self.tasks = set()
+
+    def on_registration_change(self, handler):
+        """Call handler(changes) on register, update, unregister and bulk import.
+
+        Each change is a (discord_id, old_username, new_username) tuple.
+        """
+        self.handlers.append(handler)
+        return handler
+
+    def registration_changed(self, discord_id: int, old_username: str = None, new_username: str = None):
+        self.registrations_changed([(discord_id, old_username, new_username)])
+
+    def registrations_changed(self, changes: list):
+        if not changes:
+            return
+        for handler in self.handlers:
+            try:
+                followup = handler(changes)
+            except Exception as e:
+                print(f"Registration change handler {handler.__name__} failed: {e}")
+                continue
+            if asyncio.iscoroutine(followup):
+                task = asyncio.create_task(self.run_followup(handler.__name__, followup))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+    async def run_followup(self, name: str, followup):
+        try:
+            await followup
+        except Exception as e:
+            print(f"Registration change follow-up {name} failed: {e}")
+
+invalidation_bus = InvalidationBus()
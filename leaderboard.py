@@ -0,0 +1,184 @@
+# leaderboard.py
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from database import db
+from invalidation import invalidation_bus
+from stats_cache import stats_cache, WINDOW_TTLS
+from tracing import traced
+
+# Users pulled from the database cursor (and fetched concurrently) per batch
+BATCH_SIZE = int(os.getenv('LEADERBOARD_BATCH_SIZE', '25'))
+# Users per batch when ranking from the cache alone. Nothing is fetched, so
+# big batches keep the pass to a few round trips before /leaderboard replies.
+CACHED_BATCH_SIZE = int(os.getenv('LEADERBOARD_CACHED_BATCH_SIZE', '5000'))
+# Players shown on the leaderboard
+LEADERBOARD_SIZE = 10
+# Progress edits allowed per leaderboard message while it refreshes
+MAX_EDITS = int(os.getenv('LEADERBOARD_MAX_EDITS', '3'))
+# Minimum seconds between progress edits
+EDIT_INTERVAL = float(os.getenv('LEADERBOARD_EDIT_INTERVAL', '2'))
+
+def leaderboard_entry(discord_id: int, username: str, player, mode: str, stat: str):
+    """Leaderboard row for one player, or None if they have no stats in this mode"""
+    mode_stats = player.mode(mode)
+    if not mode_stats:
+        return None
+
+    # Get ALL stats for display
+    entry = {
+        'username': username,
+        'discord_id': discord_id,
+        'wins': mode_stats.get('wins', 0),
+        'kd': mode_stats.get('kd', 0),
+        'winrate': mode_stats.get('winRate', 0),
+        'kills': mode_stats.get('kills', 0),
+        'matches': mode_stats.get('matches', 0),
+    }
+
+    # Set the value for sorting
+    entry['value'] = entry[stat]
+    return entry
+
+class TopK:
+    """Keeps only the k highest-valued entries seen so far"""
+    def __init__(self, k: int = LEADERBOARD_SIZE):
+        self.k = k
+        self.heap = []
+        self.order = itertools.count()
+
+    def add(self, entry: dict):
+        # Earlier entries win ties, like a stable sort would
+        item = (entry['value'], -next(self.order), entry)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+        elif item[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, item)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def ranked(self):
+        """Entries from highest to lowest value"""
+        return [entry for _, _, entry in sorted(self.heap, key=lambda item: item[:2], reverse=True)]
+
+class RankIndex:
+    """Memoized cache-only rankings per (mode, stat, window).
+
+    A ranking stays valid until a player's stats change (see StatsCache.on_change),
+    until a player it counted as stale is fresh again (StatsCache.on_refreshed),
+    or until the first fresh entry it counted goes stale.
+    """
+    def __init__(self):
+        self.rankings = {}
+        self.versions = {}
+
+    def version(self, time_window: str):
+        return self.versions.get(time_window, 0)
+
+    def get(self, mode: str, stat: str, time_window: str):
+        cached = self.rankings.get((mode, stat, time_window))
+        if cached is None or time.time() >= cached['valid_until']:
+            return None
+
+        # Freshness moves on without stats changing, so re-read it from the cache
+        for entry in cached['ranked']:
+            player = stats_cache.get(entry['username'], time_window)
+            entry['fresh'] = bool(player and player.is_fresh())
+            if player:
+                entry['fetched_at'] = player.fetched_at
+        return cached['ranked'], cached['user_count'], cached['stale_count']
+
+    def store(self, mode: str, stat: str, time_window: str, version: int, result: tuple, valid_until: float):
+        # Skip if stats changed while the ranking was being computed
+        if version == self.version(time_window):
+            ranked, user_count, stale_count = result
+            self.rankings[(mode, stat, time_window)] = {
+                'ranked': ranked,
+                'user_count': user_count,
+                'stale_count': stale_count,
+                'valid_until': valid_until,
+            }
+
+    def invalidate(self, time_window: str = None):
+        """Drop rankings for one window, or all of them"""
+        windows = [time_window] if time_window else list(WINDOW_TTLS)
+        for window in windows:
+            self.versions[window] = self.version(window) + 1
+        self.rankings = {key: value for key, value in self.rankings.items() if key[2] not in windows}
+
+rank_index = RankIndex()
+
+@stats_cache.on_change
+def invalidate_rankings(player):
+    rank_index.invalidate(player.time_window)
+
+@stats_cache.on_refreshed
+def invalidate_stale_counts(player):
+    # Rankings count stale players; this one no longer is
+    rank_index.invalidate(player.time_window)
+
+@invalidation_bus.on_registration_change
+def invalidate_registration_rankings(changes):
+    # Who is on the leaderboard changed, in every window
+    rank_index.invalidate()
+
+@traced('leaderboard')
+async def compute_leaderboard(mode: str, stat: str, time_window: str = 'lifetime', refresh: bool = True, on_batch=None):
+    """Stream registered users in batches and keep the top players.
+
+    With refresh=False only cached stats are used and the API is never called,
+    and the result comes from the rank index when nothing has changed.
+    Returns (ranked entries, number of registered users, number of stale players).
+    """
+    stats_cache.requested(None, time_window)
+    if not refresh:
+        cached = rank_index.get(mode, stat, time_window)
+        if cached:
+            return cached
+
+    version = rank_index.version(time_window)
+    valid_until = math.inf
+    top = TopK()
+    user_count = 0
+    stale_count = 0
+
+    # Refreshing fans out API calls between batches, so it must not hold a
+    # connection (and a pooler server connection) across them
+    batches = db.iter_user_pages(BATCH_SIZE) if refresh else db.iter_users(CACHED_BATCH_SIZE)
+    async for batch in batches:
+        user_count += len(batch)
+        if refresh:
+            results = await asyncio.gather(
+                *(stats_cache.fetch(row['epic_username'], time_window) for row in batch),
+                return_exceptions=True
+            )
+        else:
+            results = [None] * len(batch)
+
+        for row, player in zip(batch, results):
+            # Fall back to whatever the cache has if the fetch failed or was skipped
+            if player is None or isinstance(player, Exception):
+                player = stats_cache.get(row['epic_username'], time_window)
+            if player is None or not player.is_fresh():
+                stale_count += 1
+            else:
+                valid_until = min(valid_until, player.fetched_at + WINDOW_TTLS[time_window])
+            if player is None:
+                continue
+
+            entry = leaderboard_entry(row['discord_id'], row['epic_username'], player, mode, stat)
+            if entry:
+                entry['fresh'] = player.is_fresh()
+                entry['fetched_at'] = player.fetched_at
+                top.add(entry)
+
+        if on_batch:
+            await on_batch()
+
+    result = (top.ranked(), user_count, stale_count)
+    rank_index.store(mode, stat, time_window, version, result, valid_until)
+    return result
@@ -0,0 +1,119 @@
+# live_leaderboard.py
+import asyncio
+import os
+import discord
+from database import db
+from invalidation import invalidation_bus
+from leaderboard import compute_leaderboard
+from presentation import build_leaderboard_embed
+from stats_cache import stats_cache, WINDOW_TTLS
+
+# Stat changes are collected for this long before boards are re-ranked and
+# edited, so a burst of refreshes costs one edit per board (seconds)
+COALESCE_INTERVAL = float(os.getenv('LIVE_LEADERBOARD_INTERVAL', '30'))
+
+def ranking_signature(ranked: list):
+    """What a board shows, minus freshness markers; an edit is only needed when this changes"""
+    return tuple((entry['discord_id'], entry['wins'], entry['kd'], entry['winrate'], entry['kills']) for entry in ranked)
+
+class LiveLeaderboards:
+    """Pinned leaderboard messages edited only when their top players actually change.
+
+    Stat changes and registration changes mark their window dirty; nothing
+    polls. Each pass ranks every affected (mode, stat, window) once from the
+    cache and edits only the boards whose ranking differs from what they show.
+    """
+    def __init__(self):
+        self.client = None
+        self.boards = {}  # server_id -> config plus the signature currently shown
+        self.dirty_windows = set()
+        self.changed = asyncio.Event()
+        self.task = None
+        self.edits = 0
+
+    async def start(self, client: discord.Client):
+        if self.task is not None:
+            return
+        self.client = client
+        for board in await db.get_live_leaderboards():
+            self.boards[board['server_id']] = dict(board, signature=None)
+        self.mark_changed()
+        self.task = asyncio.create_task(self.run())
+
+    def add(self, server_id: int, channel_id: int, message_id: int, stat: str, mode: str, time_window: str, signature: tuple = None):
+        self.boards[server_id] = {
+            'server_id': server_id,
+            'channel_id': channel_id,
+            'message_id': message_id,
+            'stat': stat,
+            'mode': mode,
+            'time_window': time_window,
+            'signature': signature,
+        }
+
+    def remove(self, server_id: int):
+        return self.boards.pop(server_id, None)
+
+    def mark_changed(self, time_window: str = None):
+        self.dirty_windows.update([time_window] if time_window else WINDOW_TTLS)
+        self.changed.set()
+
+    async def run(self):
+        while True:
+            await self.changed.wait()
+            await asyncio.sleep(COALESCE_INTERVAL)
+            self.changed.clear()
+            windows, self.dirty_windows = self.dirty_windows, set()
+            try:
+                await self.update(windows)
+            except Exception as e:
+                print(f"Live leaderboard update failed: {e}")
+
+    async def update(self, windows: set):
+        rankings = {}
+        for board in list(self.boards.values()):
+            if board['time_window'] not in windows:
+                continue
+
+            # Boards with the same settings share one ranking
+            key = (board['mode'], board['stat'], board['time_window'])
+            if key not in rankings:
+                rankings[key] = await compute_leaderboard(*key, refresh=False)
+            ranked, _, _ = rankings[key]
+
+            signature = ranking_signature(ranked)
+            if signature != board['signature'] and await self.edit(board, ranked):
+                board['signature'] = signature
+
+    async def edit(self, board: dict, ranked: list):
+        guild = self.client.get_guild(board['server_id'])
+        channel = self.client.get_channel(board['channel_id'])
+        if guild is None or channel is None:
+            return False
+
+        embed = build_leaderboard_embed(guild, ranked, board['stat'], board['mode'], board['time_window'])
+        embed.title = "🏆 Live Server Leaderboard"
+        try:
+            await channel.get_partial_message(board['message_id']).edit(embed=embed)
+        except discord.NotFound:
+            # The message was deleted, stop maintaining it
+            self.remove(board['server_id'])
+            await db.delete_live_leaderboard(board['server_id'])
+            return False
+        except discord.HTTPException as e:
+            print(f"Failed to edit live leaderboard in server {board['server_id']}: {e}")
+            return False
+        self.edits += 1
+        return True
+
+live_leaderboards = LiveLeaderboards()
+
+@stats_cache.on_change
+def queue_live_leaderboards(player):
+    if live_leaderboards.boards:
+        live_leaderboards.mark_changed(player.time_window)
+
+@invalidation_bus.on_registration_change
+def queue_live_leaderboards_for_registration(changes):
+    if live_leaderboards.boards:
+        live_leaderboards.mark_changed()
@@ -1,32 +1,146 @@
 import discord
 from discord import app_commands
+import asyncio
+import csv
+import io
 import os
+import time
 from dotenv import load_dotenv
-import aiohttp
+from admission import admission, AdmissionCommandTree
+from cards import card_renderer, card_from_embed, attach_card
+from command_trace import command_recorder
 from database import db
+from fortnite_api import api
+from invalidation import invalidation_bus
+from leaderboard import compute_leaderboard, MAX_EDITS, EDIT_INTERVAL
+from live_leaderboard import live_leaderboards, ranking_signature
+from monitor import loop_monitor, profile, MONITOR_ENABLED
+from prefetch import activity, prefetcher
+from presentation import stats_embed, build_leaderboard_embed, mark_stale, format_age
+from refresh import refresh_scheduler
+from squad_totals import squad_totals
+from stats_cache import stats_cache, cache_key, WINDOW_LABELS
+from tracing import tracer, http_trace_config
 
 load_dotenv()
 
 intents = discord.Intents.default()
-client = discord.Client(intents=intents)
-tree = app_commands.CommandTree(client)
+# Discord REST calls (responses, followups, edits) become spans when TRACE_SPANS_FILE is set
+client = discord.Client(intents=intents, http_trace=http_trace_config() if tracer.enabled else None)
+tree = AdmissionCommandTree(client)
+background_tasks = set()
+owner_ids = set()
 
 @client.event
 async def on_ready():
     print(f'{client.user} logged in!')
+    # on_ready fires again after the gateway reconnects; startup runs once
+    if db.pool is not None:
+        return
     # Connect to database on startup
     connected = await db.connect()
     if connected:
         print("Database connected!")
+        try:
+            loaded = await stats_cache.load_snapshots()
+            print(f"Loaded {loaded} stats snapshot(s) into cache")
+        except Exception as e:
+            print(f"Failed to load stats snapshots: {e}")
+        squad_totals.start()
+        try:
+            await live_leaderboards.start(client)
+        except Exception as e:
+            print(f"Failed to start live leaderboards: {e}")
     else:
         print("Database connection failed - some features won't work")
 
+    # Keep stats warm in the background, active players first
+    refresh_scheduler.start()
+    prefetcher.start()
+
+    if MONITOR_ENABLED:
+        loop_monitor.start()
+
     try:
         synced = await tree.sync()
         print(f'Successfully synced {len(synced)} command(s)')
     except Exception as e:
         print(f'Failed to sync commands: {e}')
 
+@client.event
+async def on_interaction(interaction: discord.Interaction):
+    # Remember when each user runs commands so their stats can be prefetched
+    if interaction.type == discord.InteractionType.application_command:
+        activity.record(interaction.user.id)
+        # Anonymized trace for replay.py, when COMMAND_TRACE_FILE is set
+        command_recorder.record(interaction)
+
+def run_in_background(coro):
+    """Start a task and keep a reference so it isn't garbage collected"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def is_owner(user: discord.abc.User):
+    """Whether the user owns the bot application (or is on its team)"""
+    if not owner_ids:
+        app_info = await client.application_info()
+        if app_info.team:
+            owner_ids.update(member.id for member in app_info.team.members)
+        else:
+            owner_ids.add(app_info.owner.id)
+    return user.id in owner_ids
+
+async def send_response(interaction: discord.Interaction, *args, **kwargs):
+    """Reply directly, or as a followup if the interaction was deferred"""
+    if interaction.response.is_done():
+        await interaction.followup.send(*args, **kwargs)
+    else:
+        await interaction.response.send_message(*args, **kwargs)
+
+async def send_stats_embed(interaction: discord.Interaction, embed: discord.Embed, image: bool = False):
+    """Send a stats embed, or with image=True its fields as a rendered card"""
+    if not image:
+        await send_response(interaction, embed=embed)
+        return
+
+    card = card_from_embed(embed)
+    # A cold render can take longer than Discord waits for the first response
+    if not card_renderer.is_cached(card) and not interaction.response.is_done():
+        await interaction.response.defer()
+    png = await card_renderer.render(card)
+    await send_response(interaction, embed=embed, file=attach_card(embed, png))
+
+def cached_player(username: str, window: str):
+    """Stats that can be sent without calling the API: fresh ones, or any while degraded"""
+    stats_cache.requested(username, window)
+    player = stats_cache.get_fresh(username, window)
+    if player is None and api.is_degraded:
+        player = stats_cache.serve_stale(username, window)
+    return player
+
+async def send_player_stats(interaction: discord.Interaction, username: str, mode: str, window: str, image: bool = False, registered_as: str = None):
+    """Shared /stats and /me path: cached stats in one response, otherwise defer and fetch"""
+    player = cached_player(username, window)
+    if player is None:
+        await interaction.response.defer()
+        player = await stats_cache.fetch(username, window)
+
+    if player is None:
+        if api.is_degraded:
+            await send_response(interaction, f"The Fortnite API is unavailable right now and `{username}` isn't cached. Try again in a few minutes!")
+        elif registered_as:
+            await send_response(interaction, f"Could not find stats for **{username}**")
+        else:
+            await send_response(interaction, f"Could not find player `{username}` or their stats are private")
+        return
+
+    embed = stats_embed(player, mode, registered_as)
+    if not player.is_fresh():
+        mark_stale(embed, player.fetched_at)
+    await send_stats_embed(interaction, embed, image)
+
 # Test command
 @tree.command(name='test', description='Test if the bot is working')
 async def test(interaction: discord.Interaction):
@@ -41,25 +155,13 @@ async def register(interaction: discord.Interaction, epic_username: str):
         # First, try to get the account ID from Fortnite-API.com
         account_id = None
 
-        async with aiohttp.ClientSession() as session:
-            headers = {'Authorization': os.getenv('FORTNITE_API_KEY')}
-            stats_url = "https://fortnite-api.com/v2/stats/br/v2"
-            params = {
-                'name': epic_username,
-                'accountType': 'epic',
-                'timeWindow': 'lifetime',
-            }
-
-            async with session.get(stats_url, params=params, headers=headers, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get('status') == 200:
-                        stats_data = data.get('data', {})
-                        account = stats_data.get('account', {})
-                        account_id = account.get('id')  # Get the account ID
+        player = await stats_cache.fetch(epic_username)
+        if player:
+            account_id = player.account.get('id')  # Get the account ID
 
         # Save to database with account ID
-        await db.register_user(interaction.user.id, epic_username, account_id)
+        old_username = await db.register_user(interaction.user.id, epic_username, account_id)
+        invalidation_bus.registration_changed(interaction.user.id, old_username, epic_username)
 
         embed = discord.Embed(
             title="Account Registered!",
@@ -76,10 +178,12 @@ async def register(interaction: discord.Interaction, epic_username: str):
 
 @tree.command(name='unregister', description='Remove your linked Epic Games account')
 async def unregister(interaction: discord.Interaction):
-    await interaction.response.defer()
-
-    # Check if user is registered
-    epic_username = await db.get_user(interaction.user.id)
+    # One local delete, so the reply doesn't need a deferral
+    try:
+        epic_username = await db.unregister_user(interaction.user.id)
+    except Exception as e:
+        await interaction.response.send_message(f"Failed to unregister: {e}")
+        return
 
     if not epic_username:
         embed = discord.Embed(
@@ -87,27 +191,27 @@ async def unregister(interaction: discord.Interaction):
             description="You don't have a linked Epic Games account to remove.",
             color=discord.Color.red()
         )
-        await interaction.followup.send(embed=embed)
+        await interaction.response.send_message(embed=embed)
         return
 
-    # Remove the user from database
-    try:
-        await db.unregister_user(interaction.user.id)
+    invalidation_bus.registration_changed(interaction.user.id, epic_username, None)
 
-        embed = discord.Embed(
-            title="Account Unregistered",
-            description=f"Successfully removed **{epic_username}** from your Discord account",
-            color=discord.Color.orange()
-        )
-        embed.set_footer(text="You can register again anytime with /register")
+    embed = discord.Embed(
+        title="Account Unregistered",
+        description=f"Successfully removed **{epic_username}** from your Discord account",
+        color=discord.Color.orange()
+    )
+    embed.set_footer(text="You can register again anytime with /register")
 
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        await interaction.followup.send(f"Failed to unregister: {e}")
+    await interaction.response.send_message(embed=embed)
 
 # Me command - get your stats without typing username
 @tree.command(name='me', description='Get your Fortnite stats')
-@app_commands.describe(mode='Game mode: all, solo, duo, trio, or squad')
+@app_commands.describe(
+    mode='Game mode: all, solo, duo, trio, or squad',
+    window='Time window: lifetime or season',
+    image='Show the stats as an image card'
+)
 @app_commands.choices(mode=[
     app_commands.Choice(name='All Modes', value='all'),
     app_commands.Choice(name='Solo', value='solo'),
@@ -115,9 +219,11 @@ async def unregister(interaction: discord.Interaction):
     app_commands.Choice(name='Trio', value='trio'),
     app_commands.Choice(name='Squad', value='squad'),
 ])
-async def me(interaction: discord.Interaction, mode: str = 'all'):
-    await interaction.response.defer()
-
+@app_commands.choices(window=[
+    app_commands.Choice(name='Lifetime', value='lifetime'),
+    app_commands.Choice(name='Season', value='season'),
+])
+async def me(interaction: discord.Interaction, mode: str = 'all', window: str = 'lifetime', image: bool = False):
     # Get registered username from database
     epic_username = await db.get_user(interaction.user.id)
 
@@ -128,100 +234,24 @@ async def me(interaction: discord.Interaction, mode: str = 'all'):
             color=discord.Color.red()
         )
         embed.add_field(name="How to register:", value="Use `/register YourEpicUsername`", inline=False)
-        await interaction.followup.send(embed=embed)
+        await interaction.response.send_message(embed=embed)
         return
 
-    # Fetch stats using the registered username
-    async with aiohttp.ClientSession() as session:
-        headers = {'Authorization': os.getenv('FORTNITE_API_KEY')}
-        stats_url = "https://fortnite-api.com/v2/stats/br/v2"
-        params = {
-            'name': epic_username,
-            'accountType': 'epic',
-            'timeWindow': 'lifetime',
-        }
-
-        try:
-            async with session.get(stats_url, params=params, headers=headers, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get('status') == 200:
-                        stats_data = data.get('data', {})
-                        account = stats_data.get('account', {})
-                        all_stats = stats_data.get('stats', {}).get('all', {})
-
-                        # Create appropriate embed based on mode
-                        if mode == 'all':
-                            # Show overall stats
-                            overall_stats = all_stats.get('overall', {})
-                            embed = discord.Embed(
-                                title=f"📊 Your Overall Stats",
-                                color=discord.Color.blue()
-                            )
-
-                            if overall_stats:
-                                embed.add_field(name="Total Wins", value=f"{overall_stats.get('wins', 0):,}", inline=True)
-                                embed.add_field(name="K/D", value=f"{overall_stats.get('kd', 0):.2f}", inline=True)
-                                embed.add_field(name="Win Rate", value=f"{overall_stats.get('winRate', 0):.0f}%", inline=True)
-                                embed.add_field(name="Kills", value=f"{overall_stats.get('kills', 0):,}", inline=True)
-                                embed.add_field(name="Matches", value=f"{overall_stats.get('matches', 0):,}", inline=True)
-                                embed.add_field(name="Hours Played", value=f"{overall_stats.get('minutesPlayed', 0) // 60:,}", inline=True)
-                            else:
-                                embed.description = "Stats are private or unavailable"
-                        else:
-                            # Show specific mode stats
-                            mode_stats = all_stats.get(mode, {})
-                            mode_display = mode.capitalize()
-                            embed = discord.Embed(
-                                title=f"🎮 Your {mode_display} Stats",
-                                color=discord.Color.purple()
-                            )
-
-                            if mode_stats:
-                                embed.add_field(name="Wins", value=f"{mode_stats.get('wins', 0):,}", inline=True)
-                                embed.add_field(name="K/D", value=f"{mode_stats.get('kd', 0):.2f}", inline=True)
-                                embed.add_field(name="Win Rate", value=f"{mode_stats.get('winRate', 0):.0f}%", inline=True)
-                                embed.add_field(name="Kills", value=f"{mode_stats.get('kills', 0):,}", inline=True)
-                                embed.add_field(name="Deaths", value=f"{mode_stats.get('deaths', 0):,}", inline=True)
-                                embed.add_field(name="Matches", value=f"{mode_stats.get('matches', 0):,}", inline=True)
-
-                                # Add placement stats based on mode
-                                if mode == 'solo':
-                                    embed.add_field(name="Top 10", value=f"{mode_stats.get('top10', 0):,}", inline=True)
-                                    embed.add_field(name="Top 25", value=f"{mode_stats.get('top25', 0):,}", inline=True)
-                                elif mode == 'duo':
-                                    embed.add_field(name="Top 5", value=f"{mode_stats.get('top5', 0):,}", inline=True)
-                                    embed.add_field(name="Top 12", value=f"{mode_stats.get('top12', 0):,}", inline=True)
-                                elif mode == 'trio':
-                                    embed.add_field(name="Top 3", value=f"{mode_stats.get('top3', 0):,}", inline=True)
-                                    embed.add_field(name="Top 6", value=f"{mode_stats.get('top6', 0):,}", inline=True)
-                                elif mode == 'squad':
-                                    embed.add_field(name="Top 3", value=f"{mode_stats.get('top3', 0):,}", inline=True)
-                                    embed.add_field(name="Top 6", value=f"{mode_stats.get('top6', 0):,}", inline=True)
-
-                                embed.add_field(name="Avg Kills/Match", value=f"{mode_stats.get('killsPerMatch', 0):.1f}", inline=True)
-                            else:
-                                embed.description = f"No {mode_display} stats available"
-
-                        embed.set_footer(text=f"Registered as: {epic_username}")
-                        await interaction.followup.send(embed=embed)
-                    else:
-                        await interaction.followup.send(f"Could not find stats for **{epic_username}**")
-                else:
-                    await interaction.followup.send(f"Failed to fetch stats for **{epic_username}**")
-        except Exception as e:
-            await interaction.followup.send(f"Error fetching stats: {e}")
+    try:
+        await send_player_stats(interaction, epic_username, mode, window, image, registered_as=epic_username)
+    except Exception as e:
+        await send_response(interaction, f"Error fetching stats: {e}")
 
 # Update command - change your registered username
 @tree.command(name='update', description='Update your linked Epic Games account')
 async def update(interaction: discord.Interaction, new_epic_username: str):
-    await interaction.response.defer()
-
-    # Check if user is already registered
-    old_username = await db.get_user(interaction.user.id)
-
-    # Update registration
-    await db.register_user(interaction.user.id, new_epic_username)
+    # Update registration; the new account ID is looked up in the background
+    try:
+        old_username = await db.register_user(interaction.user.id, new_epic_username)
+    except Exception as e:
+        await interaction.response.send_message(f"Failed to update: {e}")
+        return
+    invalidation_bus.registration_changed(interaction.user.id, old_username, new_epic_username)
 
     if old_username:
         embed = discord.Embed(
@@ -236,12 +266,14 @@ async def update(interaction: discord.Interaction, new_epic_username: str):
             color=discord.Color.green()
         )
 
-    await interaction.followup.send(embed=embed)
+    await interaction.response.send_message(embed=embed)
 
 @tree.command(name='stats', description='Get Fortnite player statistics')
 @app_commands.describe(
     username='Epic Games username',
-    mode='Game mode: all, solo, duo, trio, or squad'
+    mode='Game mode: all, solo, duo, trio, or squad',
+    window='Time window: lifetime or season',
+    image='Show the stats as an image card'
 )
 @app_commands.choices(mode=[
     app_commands.Choice(name='All Modes', value='all'),
@@ -250,95 +282,56 @@ async def update(interaction: discord.Interaction, new_epic_username: str):
     app_commands.Choice(name='Trio', value='trio'),
     app_commands.Choice(name='Squad', value='squad'),
 ])
-async def stats(interaction: discord.Interaction, username: str, mode: str = 'all'):
-    await interaction.response.defer()
-
-    async with aiohttp.ClientSession() as session:
-        api_key = os.getenv('FORTNITE_API_KEY')
-        headers = {'Authorization': api_key} if api_key else {}
+@app_commands.choices(window=[
+    app_commands.Choice(name='Lifetime', value='lifetime'),
+    app_commands.Choice(name='Season', value='season'),
+])
+async def stats(interaction: discord.Interaction, username: str, mode: str = 'all', window: str = 'lifetime', image: bool = False):
+    try:
+        await send_player_stats(interaction, username, mode, window, image)
+    except Exception as e:
+        await send_response(interaction, f"Error fetching stats: {e}")
 
-        stats_url = "https://fortnite-api.com/v2/stats/br/v2"
-        params = {
-            'name': username,
-            'accountType': 'epic',
-            'timeWindow': 'lifetime',
-        }
+async def refresh_leaderboard(interaction: discord.Interaction, stat: str, mode: str, window: str):
+    """Fetch stale players and edit the leaderboard message as fresh data arrives"""
+    edits = 0
+    last_edit = time.monotonic()
 
+    async def show_progress():
+        nonlocal edits, last_edit
+        # Keep one edit back for the final result
+        if edits >= MAX_EDITS - 1 or time.monotonic() - last_edit < EDIT_INTERVAL:
+            return
+        edits += 1
+        last_edit = time.monotonic()
         try:
-            async with session.get(stats_url, params=params, headers=headers, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get('status') == 200:
-                        stats_data = data.get('data', {})
-                        account = stats_data.get('account', {})
-                        all_stats = stats_data.get('stats', {}).get('all', {})
-
-                        # Create appropriate embed based on mode
-                        if mode == 'all':
-                            # Show overall stats
-                            overall_stats = all_stats.get('overall', {})
-                            embed = discord.Embed(
-                                title=f"{account.get('name')}'s Overall Stats",
-                                color=discord.Color.blue()
-                            )
-
-                            if overall_stats:
-                                embed.add_field(name="Total Wins", value=f"{overall_stats.get('wins', 0):,}", inline=True)
-                                embed.add_field(name="K/D", value=f"{overall_stats.get('kd', 0):.2f}", inline=True)
-                                embed.add_field(name="Win Rate", value=f"{overall_stats.get('winRate', 0):.0f}%", inline=True)
-                                embed.add_field(name="Kills", value=f"{overall_stats.get('kills', 0):,}", inline=True)
-                                embed.add_field(name="Matches", value=f"{overall_stats.get('matches', 0):,}", inline=True)
-                                embed.add_field(name="Hours Played", value=f"{overall_stats.get('minutesPlayed', 0) // 60:,}", inline=True)
-                            else:
-                                embed.description = "Stats are private or unavailable"
-                        else:
-                            # Show specific mode stats
-                            mode_stats = all_stats.get(mode, {})
-                            mode_display = mode.capitalize()
-                            embed = discord.Embed(
-                                title=f"{account.get('name')}'s {mode_display} Stats",
-                                color=discord.Color.purple()
-                            )
-
-                            if mode_stats:
-                                embed.add_field(name="Wins", value=f"{mode_stats.get('wins', 0):,}", inline=True)
-                                embed.add_field(name="K/D", value=f"{mode_stats.get('kd', 0):.2f}", inline=True)
-                                embed.add_field(name="Win Rate", value=f"{mode_stats.get('winRate', 0):.0f}%", inline=True)
-                                embed.add_field(name="Kills", value=f"{mode_stats.get('kills', 0):,}", inline=True)
-                                embed.add_field(name="Deaths", value=f"{mode_stats.get('deaths', 0):,}", inline=True)
-                                embed.add_field(name="Matches", value=f"{mode_stats.get('matches', 0):,}", inline=True)
-
-                                # Add placement stats based on mode
-                                if mode == 'solo':
-                                    embed.add_field(name="Top 10", value=f"{mode_stats.get('top10', 0):,}", inline=True)
-                                    embed.add_field(name="Top 25", value=f"{mode_stats.get('top25', 0):,}", inline=True)
-                                elif mode == 'duo':
-                                    embed.add_field(name="Top 5", value=f"{mode_stats.get('top5', 0):,}", inline=True)
-                                    embed.add_field(name="Top 12", value=f"{mode_stats.get('top12', 0):,}", inline=True)
-                                elif mode == 'trio':
-                                    embed.add_field(name="Top 3", value=f"{mode_stats.get('top3', 0):,}", inline=True)
-                                    embed.add_field(name="Top 6", value=f"{mode_stats.get('top6', 0):,}", inline=True)
-                                elif mode == 'squad':
-                                    embed.add_field(name="Top 3", value=f"{mode_stats.get('top3', 0):,}", inline=True)
-                                    embed.add_field(name="Top 6", value=f"{mode_stats.get('top6', 0):,}", inline=True)
-
-                                embed.add_field(name="Avg Kills/Match", value=f"{mode_stats.get('killsPerMatch', 0):.1f}", inline=True)
-                            else:
-                                embed.description = f"No {mode_display} stats available"
-
-                        await interaction.followup.send(embed=embed)
-                    else:
-                        await interaction.followup.send(f"Player not found: `{username}`")
-                else:
-                    await interaction.followup.send(f"Could not find player `{username}` or their stats are private")
-
+            leaderboard_data, _, stale = await compute_leaderboard(mode, stat, window, refresh=False)
+            await interaction.edit_original_response(
+                embed=build_leaderboard_embed(interaction.guild, leaderboard_data, stat, mode, window, refreshing=stale)
+            )
         except Exception as e:
-            await interaction.followup.send(f"Error fetching stats: {e}")
+            print(f"Leaderboard progress edit failed: {e}")
+
+    try:
+        # An identical refresh already running for this guild is shared, not repeated
+        leaderboard_data, _, _ = await admission.share(
+            ('leaderboard', interaction.guild.id, stat, mode, window),
+            lambda: compute_leaderboard(mode, stat, window, on_batch=show_progress)
+        )
+        if leaderboard_data:
+            await interaction.edit_original_response(
+                embed=build_leaderboard_embed(interaction.guild, leaderboard_data, stat, mode, window)
+            )
+        else:
+            await interaction.edit_original_response(content="No stats found for this mode.", embed=None)
+    except Exception as e:
+        print(f"Leaderboard refresh failed: {e}")
 
 @tree.command(name='leaderboard', description='Show server leaderboard')
 @app_commands.describe(
     stat='Stat to rank by',
-    mode='Game mode to filter'
+    mode='Game mode to filter',
+    window='Time window: lifetime or season'
 )
 @app_commands.choices(
     stat=[
@@ -353,110 +346,35 @@ async def stats(interaction: discord.Interaction, username: str, mode: str = 'al
         app_commands.Choice(name='Duo', value='duo'),
         app_commands.Choice(name='Trio', value='trio'),
         app_commands.Choice(name='Squad', value='squad'),
+    ],
+    window=[
+        app_commands.Choice(name='Lifetime', value='lifetime'),
+        app_commands.Choice(name='Season', value='season'),
     ]
 )
-async def leaderboard(interaction: discord.Interaction, stat: str = 'wins', mode: str = 'overall'):
-    await interaction.response.defer()
+async def leaderboard(interaction: discord.Interaction, stat: str = 'wins', mode: str = 'overall', window: str = 'lifetime'):
+    # Rank from cached stats first so something is on screen straight away
+    leaderboard_data, user_count, stale = await compute_leaderboard(mode, stat, window, refresh=False)
 
-    # Get all registered users from database
-    async with db.pool.acquire() as conn:
-        rows = await conn.fetch('SELECT discord_id, epic_username FROM users')
-
-    if not rows:
-        await interaction.followup.send("No registered users yet! Use `/register` to add yourself.")
+    if not user_count:
+        await interaction.response.send_message("No registered users yet! Use `/register` to add yourself.")
         return
 
-    # Fetch stats for all registered users
-    leaderboard_data = []
-
-    async with aiohttp.ClientSession() as session:
-        headers = {'Authorization': os.getenv('FORTNITE_API_KEY')}
-
-        for row in rows:
-            discord_id = row['discord_id']
-            username = row['epic_username']
-
-            # Fetch their stats
-            stats_url = "https://fortnite-api.com/v2/stats/br/v2"
-            params = {
-                'name': username,
-                'accountType': 'epic',
-                'timeWindow': 'lifetime',
-            }
-
-            try:
-                async with session.get(stats_url, params=params, headers=headers, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('status') == 200:
-                            stats_data = data.get('data', {})
-                            all_stats = stats_data.get('stats', {}).get('all', {})
-
-                            # Get the specific mode stats
-                            if mode == 'overall':
-                                mode_stats = all_stats.get('overall', {})
-                            else:
-                                mode_stats = all_stats.get(mode, {})
-
-                            if mode_stats:
-                                # Get ALL stats for display
-                                player_data = {
-                                    'username': username,
-                                    'discord_id': discord_id,
-                                    'wins': mode_stats.get('wins', 0),
-                                    'kd': mode_stats.get('kd', 0),
-                                    'winrate': mode_stats.get('winRate', 0),
-                                    'kills': mode_stats.get('kills', 0),
-                                    'matches': mode_stats.get('matches', 0),
-                                    'value': 0  # This will be set based on sort stat
-                                }
-
-                                # Set the value for sorting
-                                player_data['value'] = player_data[stat]
-
-                                leaderboard_data.append(player_data)
-            except Exception as e:
-                continue
-
-    if not leaderboard_data:
-        await interaction.followup.send("No stats found for this mode.")
+    if not stale and not leaderboard_data:
+        await interaction.response.send_message("No stats found for this mode.")
         return
 
-    # Sort by the requested stat
-    leaderboard_data.sort(key=lambda x: x['value'], reverse=True)
-
-    # Create embed
-    embed = discord.Embed(
-        title=f"🏆 Server Leaderboard",
-        description=f"**Sorted by:** {stat.upper()} | **Mode:** {mode.capitalize()}",
-        color=discord.Color.gold()
-    )
+    # While the API is degraded the cached ranking is all there is; the refresh
+    # scheduler catches registered players up once it recovers
+    if api.is_degraded:
+        stale = 0
 
-    # Display top 10 with ALL stats
-    for i, player in enumerate(leaderboard_data[:10], 1):
-        # Try to get member name
-        member = interaction.guild.get_member(player['discord_id'])
-        display_name = member.display_name if member else player['username']
-
-        # Medals for top 3
-        medal = "🥇 " if i == 1 else "🥈 " if i == 2 else "🥉 " if i == 3 else ""
-
-        # Format all stats for display
-        stats_text = (
-            f"**Wins:** {player['wins']:,} | "
-            f"**K/D:** {player['kd']:.2f} | "
-            f"**WR:** {player['winrate']:.0f}% | "
-            f"**Kills:** {player['kills']:,}"
-        )
-
-        embed.add_field(
-            name=f"{medal}#{i} {display_name}",
-            value=stats_text,
-            inline=False
-        )
+    embed = build_leaderboard_embed(interaction.guild, leaderboard_data, stat, mode, window, refreshing=stale)
+    await interaction.response.send_message(embed=embed)
 
-    embed.set_footer(text=f"Showing top {min(10, len(leaderboard_data))} players • Sorted by {stat.upper()}")
-    await interaction.followup.send(embed=embed)
+    # Then fetch stale players in the background and edit the message in place
+    if stale:
+        run_in_background(refresh_leaderboard(interaction, stat, mode, window))
 
 
 @tree.command(name='squad_create', description='Create a new squad')
@@ -470,39 +388,21 @@ async def squad_create(interaction: discord.Interaction, squad_name: str):
         return
 
     try:
-        async with db.pool.acquire() as conn:
-            # Check if user already owns a squad in this server
-            existing_owned = await conn.fetchval('''
-                SELECT squad_name FROM squads 
-                WHERE created_by = $1 AND server_id = $2
-            ''', interaction.user.id, interaction.guild.id)
-
-            if existing_owned:
-                await interaction.followup.send(f"You already own squad **{existing_owned}**! Delete it first with `/squad_delete`")
-                return
-
-            # Check if squad name exists in this server
-            existing = await conn.fetchval('''
-                SELECT COUNT(*) FROM squads 
-                WHERE squad_name = $1 AND server_id = $2
-            ''', squad_name, interaction.guild.id)
-
-            if existing > 0:
-                await interaction.followup.send(f"Squad **{squad_name}** already exists in this server!")
-                return
-
-            # Create the squad
-            squad_id = await conn.fetchval('''
-                INSERT INTO squads (squad_name, created_by, server_id)
-                VALUES ($1, $2, $3)
-                RETURNING squad_id
-            ''', squad_name, interaction.user.id, interaction.guild.id)
-
-            # Add creator as first member
-            await conn.execute('''
-                INSERT INTO squad_members (squad_id, discord_id)
-                VALUES ($1, $2)
-            ''', squad_id, interaction.user.id)
+        # Check if user already owns a squad in this server
+        existing_owned = await db.get_owned_squad(interaction.user.id, interaction.guild.id)
+
+        if existing_owned:
+            await interaction.followup.send(f"You already own squad **{existing_owned}**! Delete it first with `/squad_delete`")
+            return
+
+        # Create the squad with the creator as first member
+        squad_id = await db.create_squad(squad_name, interaction.user.id, interaction.guild.id)
+
+        if squad_id is None:
+            await interaction.followup.send(f"Squad **{squad_name}** already exists in this server!")
+            return
+
+        run_in_background(squad_totals.refresh_squad(squad_id))
 
         embed = discord.Embed(
             title="Squad Created!",
@@ -523,51 +423,33 @@ async def squad_join(interaction: discord.Interaction, squad_name: str):
     await interaction.response.defer()
 
     try:
-        async with db.pool.acquire() as conn:
-            # Get squad info
-            squad = await conn.fetchrow('''
-                SELECT squad_id, created_by FROM squads 
-                WHERE squad_name = $1 AND server_id = $2
-            ''', squad_name, interaction.guild.id)
-
-            if not squad:
-                await interaction.followup.send(f"Squad **{squad_name}** not found in this server!")
-                return
-
-            squad_id = squad['squad_id']
-
-            # Check if already in a squad
-            current_squad = await conn.fetchval('''
-                SELECT s.squad_name 
-                FROM squad_members sm
-                JOIN squads s ON s.squad_id = sm.squad_id
-                WHERE sm.discord_id = $1 AND s.server_id = $2
-            ''', interaction.user.id, interaction.guild.id)
-
-            if current_squad:
-                if current_squad == squad_name:
-                    await interaction.followup.send(f"You're already in **{squad_name}**!")
-                else:
-                    await interaction.followup.send(f"You're already in squad **{current_squad}**! Leave it first with `/squad_leave`")
-                return
-
-            # Check squad size (max 4)
-            member_count = await conn.fetchval(
-                'SELECT COUNT(*) FROM squad_members WHERE squad_id = $1',
-                squad_id
-            )
+        # Get squad info
+        squad = await db.get_squad(squad_name, interaction.guild.id)
+
+        if not squad:
+            await interaction.followup.send(f"Squad **{squad_name}** not found in this server!")
+            return
 
-            if member_count >= 4:
-                await interaction.followup.send(f"Squad **{squad_name}** is full! (4/4)")
-                return
+        squad_id = squad['squad_id']
 
-            # Add to squad
-            await conn.execute(
-                'INSERT INTO squad_members (squad_id, discord_id) VALUES ($1, $2)',
-                squad_id, interaction.user.id
-            )
+        # Check if already in a squad
+        current_squad = await db.get_member_squad(interaction.user.id, interaction.guild.id)
+
+        if current_squad:
+            if current_squad['squad_name'] == squad_name:
+                await interaction.followup.send(f"You're already in **{squad_name}**!")
+            else:
+                await interaction.followup.send(f"You're already in squad **{current_squad['squad_name']}**! Leave it first with `/squad_leave`")
+            return
 
-            member_count += 1
+        # Add to squad unless it's full (max 4)
+        member_count = await db.add_squad_member(squad_id, interaction.user.id)
+
+        if member_count is None:
+            await interaction.followup.send(f"Squad **{squad_name}** is full! (4/4)")
+            return
+
+        run_in_background(squad_totals.refresh_squad(squad_id))
 
         embed = discord.Embed(
             title="Joined Squad!",
@@ -585,32 +467,25 @@ async def squad_leave(interaction: discord.Interaction):
     await interaction.response.defer()
 
     try:
-        async with db.pool.acquire() as conn:
-            # Find user's squad
-            squad = await conn.fetchrow('''
-                SELECT s.squad_id, s.squad_name, s.created_by
-                FROM squad_members sm
-                JOIN squads s ON s.squad_id = sm.squad_id
-                WHERE sm.discord_id = $1 AND s.server_id = $2
-            ''', interaction.user.id, interaction.guild.id)
-
-            if not squad:
-                await interaction.followup.send("You're not in a squad!")
-                return
-
-            # Check if they're the owner
-            if squad['created_by'] == interaction.user.id:
-                await interaction.followup.send(
-                    f"You own **{squad['squad_name']}**! "
-                    f"Transfer ownership with `/squad_transfer` or delete with `/squad_delete`"
-                )
-                return
-
-            # Leave the squad
-            await conn.execute('''
-                DELETE FROM squad_members 
-                WHERE squad_id = $1 AND discord_id = $2
-            ''', squad['squad_id'], interaction.user.id)
+        # Find user's squad
+        squad = await db.get_member_squad(interaction.user.id, interaction.guild.id)
+
+        if not squad:
+            await interaction.followup.send("You're not in a squad!")
+            return
+
+        # Check if they're the owner
+        if squad['created_by'] == interaction.user.id:
+            await interaction.followup.send(
+                f"You own **{squad['squad_name']}**! "
+                f"Transfer ownership with `/squad_transfer` or delete with `/squad_delete`"
+            )
+            return
+
+        # Leave the squad
+        await db.remove_squad_member(squad['squad_id'], interaction.user.id)
+
+        run_in_background(squad_totals.refresh_squad(squad['squad_id']))
 
         embed = discord.Embed(
             title="👋 Left Squad",
@@ -627,15 +502,7 @@ async def squad_list(interaction: discord.Interaction):
     await interaction.response.defer()
 
     try:
-        async with db.pool.acquire() as conn:
-            squads = await conn.fetch('''
-                SELECT s.squad_name, s.created_by, COUNT(sm.discord_id) as member_count
-                FROM squads s
-                LEFT JOIN squad_members sm ON s.squad_id = sm.squad_id
-                WHERE s.server_id = $1
-                GROUP BY s.squad_id, s.squad_name, s.created_by
-                ORDER BY member_count DESC
-            ''', interaction.guild.id)
+        squads = await db.list_squads(interaction.guild.id)
 
         if not squads:
             await interaction.followup.send("No squads in this server yet! Create one with `/squad_create`")
@@ -673,39 +540,22 @@ async def squad_info(interaction: discord.Interaction, squad_name: str = None):
     await interaction.response.defer()
 
     try:
-        async with db.pool.acquire() as conn:
+        if squad_name:
+            # Get specific squad
+            squad = await db.get_squad(squad_name, interaction.guild.id)
+        else:
+            # Get user's squad
+            squad = await db.get_member_squad(interaction.user.id, interaction.guild.id)
+
+        if not squad:
             if squad_name:
-                # Get specific squad
-                squad_query = '''
-                    SELECT s.squad_id, s.squad_name, s.created_by, s.created_at
-                    FROM squads s
-                    WHERE s.squad_name = $1 AND s.server_id = $2
-                '''
-                squad = await conn.fetchrow(squad_query, squad_name, interaction.guild.id)
+                await interaction.followup.send(f"Squad **{squad_name}** not found!")
             else:
-                # Get user's squad
-                squad_query = '''
-                    SELECT s.squad_id, s.squad_name, s.created_by, s.created_at
-                    FROM squad_members sm
-                    JOIN squads s ON s.squad_id = sm.squad_id
-                    WHERE sm.discord_id = $1 AND s.server_id = $2
-                '''
-                squad = await conn.fetchrow(squad_query, interaction.user.id, interaction.guild.id)
-
-            if not squad:
-                if squad_name:
-                    await interaction.followup.send(f"Squad **{squad_name}** not found!")
-                else:
-                    await interaction.followup.send("You're not in a squad! Join one or specify a squad name.")
-                return
-
-            # Get members
-            members = await conn.fetch('''
-                SELECT sm.discord_id, u.epic_username
-                FROM squad_members sm
-                LEFT JOIN users u ON u.discord_id = sm.discord_id
-                WHERE sm.squad_id = $1
-            ''', squad['squad_id'])
+                await interaction.followup.send("You're not in a squad! Join one or specify a squad name.")
+            return
+
+        # Get members
+        members = await db.get_squad_members(squad['squad_id'])
 
         # Create embed
         embed = discord.Embed(
@@ -749,76 +599,69 @@ async def squad_info(interaction: discord.Interaction, squad_name: str = None):
         await interaction.followup.send(f"Error getting squad info: {e}")
 
 @tree.command(name='squad_stats', description='View combined squad statistics')
-@app_commands.describe(squad_name='Squad name (leave empty for your squad)')
-async def squad_stats(interaction: discord.Interaction, squad_name: str = None):
-    await interaction.response.defer()
-
+@app_commands.describe(
+    squad_name='Squad name (leave empty for your squad)',
+    window='Time window: lifetime or season',
+    image='Show the stats as an image card'
+)
+@app_commands.choices(window=[
+    app_commands.Choice(name='Lifetime', value='lifetime'),
+    app_commands.Choice(name='Season', value='season'),
+])
+async def squad_stats(interaction: discord.Interaction, squad_name: str = None, window: str = 'lifetime', image: bool = False):
     try:
-        async with db.pool.acquire() as conn:
-            # Get squad info (similar to squad_info)
-            if not squad_name:
-                squad = await conn.fetchrow('''
-                    SELECT s.squad_id, s.squad_name
-                    FROM squad_members sm
-                    JOIN squads s ON s.squad_id = sm.squad_id
-                    WHERE sm.discord_id = $1 AND s.server_id = $2
-                ''', interaction.user.id, interaction.guild.id)
-            else:
-                squad = await conn.fetchrow('''
-                    SELECT squad_id, squad_name
-                    FROM squads
-                    WHERE squad_name = $1 AND server_id = $2
-                ''', squad_name, interaction.guild.id)
-
-            if not squad:
-                await interaction.followup.send("Squad not found!")
-                return
-
-            # Get all squad members' Epic usernames
-            members = await conn.fetch('''
-                SELECT u.epic_username
-                FROM squad_members sm
-                JOIN users u ON u.discord_id = sm.discord_id
-                WHERE sm.squad_id = $1 AND u.epic_username IS NOT NULL
-            ''', squad['squad_id'])
+        # Get squad info (similar to squad_info)
+        if not squad_name:
+            squad = await db.get_member_squad(interaction.user.id, interaction.guild.id)
+        else:
+            squad = await db.get_squad(squad_name, interaction.guild.id)
+
+        if not squad:
+            await interaction.response.send_message("Squad not found!")
+            return
+
+        # Registered squad members' Epic usernames
+        members = [member for member in await db.get_squad_members(squad['squad_id']) if member['epic_username']]
 
         if not members:
-            await interaction.followup.send(f"No registered players in **{squad['squad_name']}**")
+            await interaction.response.send_message(f"No registered players in **{squad['squad_name']}**")
             return
 
-        # Fetch stats for all members
-        total_wins = 0
-        total_kills = 0
-        total_matches = 0
+        # Only defer when some member has to be fetched from the API
+        if not all(cached_player(member['epic_username'], window) for member in members):
+            await interaction.response.defer()
 
-        async with aiohttp.ClientSession() as session:
-            headers = {'Authorization': os.getenv('FORTNITE_API_KEY')}
+        # Fetch stats for all members
+        async def combine_stats():
+            total_wins = 0
+            total_kills = 0
+            total_matches = 0
+            oldest_stale = None  # fetched_at of the oldest member stats past their TTL
 
             for member in members:
-                username = member['epic_username']
-                stats_url = "https://fortnite-api.com/v2/stats/br/v2"
-                params = {
-                    'name': username,
-                    'accountType': 'epic',
-                    'timeWindow': 'lifetime',
-                }
-
-                try:
-                    async with session.get(stats_url, params=params, headers=headers) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if data.get('status') == 200:
-                                stats = data.get('data', {}).get('stats', {}).get('all', {}).get('overall', {})
-                                total_wins += stats.get('wins', 0)
-                                total_kills += stats.get('kills', 0)
-                                total_matches += stats.get('matches', 0)
-                except:
+                player = await stats_cache.fetch(member['epic_username'], window)
+                if player is None:
                     continue
+                if not player.is_fresh():
+                    oldest_stale = min(oldest_stale or player.fetched_at, player.fetched_at)
+
+                stats = player.mode('overall')
+                total_wins += stats.get('wins', 0)
+                total_kills += stats.get('kills', 0)
+                total_matches += stats.get('matches', 0)
+
+            return total_wins, total_kills, total_matches, oldest_stale
+
+        # Someone else already asking for this squad shares their result
+        total_wins, total_kills, total_matches, oldest_stale = await admission.share(
+            ('squad_stats', interaction.guild.id, squad['squad_id'], window),
+            combine_stats
+        )
 
         # Create embed
         embed = discord.Embed(
             title=f"Squad Stats: {squad['squad_name']}",
-            description=f"Combined lifetime performance ({len(members)} players)",
+            description=f"Combined {WINDOW_LABELS[window].lower()} performance ({len(members)} players)",
             color=discord.Color.gold()
         )
 
@@ -831,10 +674,264 @@ async def squad_stats(interaction: discord.Interaction, squad_name: str = None):
             embed.add_field(name="Squad K/D", value=f"{squad_kd:.2f}", inline=True)
             embed.add_field(name="Win Rate", value=f"{(total_wins/total_matches*100):.0f}%", inline=True)
 
-        await interaction.followup.send(embed=embed)
+        if oldest_stale is not None:
+            mark_stale(embed, oldest_stale)
+        await send_stats_embed(interaction, embed, image)
+
+    except Exception as e:
+        await send_response(interaction, f"Error: {e}")
+
+@tree.command(name='squad_leaderboard', description='Rank the squads in this server')
+@app_commands.describe(
+    stat='Stat to rank by',
+    mode='Game mode to filter',
+    window='Time window: lifetime or season'
+)
+@app_commands.choices(
+    stat=[
+        app_commands.Choice(name='Wins', value='wins'),
+        app_commands.Choice(name='K/D Ratio', value='kd'),
+        app_commands.Choice(name='Win Rate', value='winrate'),
+        app_commands.Choice(name='Kills', value='kills'),
+    ],
+    mode=[
+        app_commands.Choice(name='All Modes', value='overall'),
+        app_commands.Choice(name='Solo', value='solo'),
+        app_commands.Choice(name='Duo', value='duo'),
+        app_commands.Choice(name='Trio', value='trio'),
+        app_commands.Choice(name='Squad', value='squad'),
+    ],
+    window=[
+        app_commands.Choice(name='Lifetime', value='lifetime'),
+        app_commands.Choice(name='Season', value='season'),
+    ]
+)
+async def squad_leaderboard(interaction: discord.Interaction, stat: str = 'wins', mode: str = 'overall', window: str = 'lifetime'):
+    try:
+        # Ranked from the materialized squad totals, no API calls
+        squads = await db.get_squad_leaderboard(interaction.guild.id, window, mode, stat)
+
+        if not squads:
+            await interaction.response.send_message("No squads with stats yet! Create one with `/squad_create`")
+            return
+
+        embed = discord.Embed(
+            title="🏆 Squad Leaderboard",
+            description=f"**Sorted by:** {stat.upper()} | **Mode:** {mode.capitalize()} | **Window:** {WINDOW_LABELS[window]}",
+            color=discord.Color.gold()
+        )
+
+        for i, squad in enumerate(squads, 1):
+            medal = "🥇 " if i == 1 else "🥈 " if i == 2 else "🥉 " if i == 3 else ""
+            stats_text = (
+                f"**Wins:** {squad['wins']:,} | "
+                f"**K/D:** {squad['kd']:.2f} | "
+                f"**WR:** {squad['winrate']:.0f}% | "
+                f"**Kills:** {squad['kills']:,}"
+            )
+            embed.add_field(
+                name=f"{medal}#{i} {squad['squad_name']} ({squad['members']} players)",
+                value=stats_text,
+                inline=False
+            )
+
+        embed.set_footer(text=f"Showing top {len(squads)} squads • Combined stored stats of registered members")
+        await interaction.response.send_message(embed=embed)
+
+    except Exception as e:
+        await send_response(interaction, f"Error loading squad leaderboard: {e}")
+
+live_group = app_commands.Group(
+    name='live_leaderboard',
+    description='Pinned leaderboard that updates itself',
+    guild_only=True,
+    default_permissions=discord.Permissions(manage_guild=True)
+)
 
+@live_group.command(name='enable', description='Post a leaderboard in this channel that stays up to date')
+@app_commands.describe(
+    stat='Stat to rank by',
+    mode='Game mode to filter',
+    window='Time window: lifetime or season'
+)
+@app_commands.choices(
+    stat=[
+        app_commands.Choice(name='Wins', value='wins'),
+        app_commands.Choice(name='K/D Ratio', value='kd'),
+        app_commands.Choice(name='Win Rate', value='winrate'),
+        app_commands.Choice(name='Kills', value='kills'),
+    ],
+    mode=[
+        app_commands.Choice(name='All Modes', value='overall'),
+        app_commands.Choice(name='Solo', value='solo'),
+        app_commands.Choice(name='Duo', value='duo'),
+        app_commands.Choice(name='Trio', value='trio'),
+        app_commands.Choice(name='Squad', value='squad'),
+    ],
+    window=[
+        app_commands.Choice(name='Lifetime', value='lifetime'),
+        app_commands.Choice(name='Season', value='season'),
+    ]
+)
+async def live_enable(interaction: discord.Interaction, stat: str = 'wins', mode: str = 'overall', window: str = 'lifetime'):
+    await interaction.response.defer(ephemeral=True)
+    try:
+        leaderboard_data, _, _ = await compute_leaderboard(mode, stat, window, refresh=False)
+        embed = build_leaderboard_embed(interaction.guild, leaderboard_data, stat, mode, window)
+        embed.title = "🏆 Live Server Leaderboard"
+        message = await interaction.channel.send(embed=embed)
+        try:
+            await message.pin()
+        except discord.HTTPException:
+            pass  # Pinning is optional, the message still updates
+
+        # Replace any previous board in this server
+        await db.save_live_leaderboard(interaction.guild.id, message.channel.id, message.id, stat, mode, window)
+        live_leaderboards.add(
+            interaction.guild.id, message.channel.id, message.id, stat, mode, window,
+            signature=ranking_signature(leaderboard_data)
+        )
+        await interaction.followup.send(
+            f"Live leaderboard posted in {message.channel.mention}. It updates when the ranking changes.",
+            ephemeral=True
+        )
+    except discord.Forbidden:
+        await interaction.followup.send("I don't have permission to post in this channel.", ephemeral=True)
+    except Exception as e:
+        await interaction.followup.send(f"Error enabling live leaderboard: {e}", ephemeral=True)
+
+@live_group.command(name='disable', description="Stop updating this server's live leaderboard")
+async def live_disable(interaction: discord.Interaction):
+    try:
+        removed = await db.delete_live_leaderboard(interaction.guild.id)
+        live_leaderboards.remove(interaction.guild.id)
+        if removed:
+            await interaction.response.send_message(
+                "Live leaderboard disabled. The last posted message is left as it is.",
+                ephemeral=True
+            )
+        else:
+            await interaction.response.send_message("This server has no live leaderboard.", ephemeral=True)
+    except Exception as e:
+        await send_response(interaction, f"Error disabling live leaderboard: {e}", ephemeral=True)
+
+tree.add_command(live_group)
+
+registrations_group = app_commands.Group(name='registrations', description='Bulk registration import/export (owner only)')
+
+def parse_registrations_csv(text: str):
+    """Read discord_id,epic_username[,account_id] rows; returns (records, skipped row count)"""
+    records = []
+    skipped = 0
+    for row in csv.DictReader(io.StringIO(text)):
+        discord_id = (row.get('discord_id') or '').strip()
+        epic_username = (row.get('epic_username') or '').strip()
+        account_id = (row.get('account_id') or '').strip() or None
+        if not discord_id.isdigit() or not epic_username or len(epic_username) > 100:
+            skipped += 1
+            continue
+        records.append((int(discord_id), epic_username, account_id))
+    return records, skipped
+
+@registrations_group.command(name='import', description='Register users in bulk from a CSV file')
+@app_commands.describe(file='CSV with columns discord_id, epic_username and optionally account_id')
+async def registrations_import(interaction: discord.Interaction, file: discord.Attachment):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("This command is only for the bot owner.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    try:
+        records, skipped = parse_registrations_csv((await file.read()).decode('utf-8-sig'))
+        if not records:
+            await interaction.followup.send("No valid rows found. Expected columns: `discord_id,epic_username,account_id`", ephemeral=True)
+            return
+
+        imported = await db.import_registrations(records)
+
+        # One bus event for the whole import: caches, rankings, refresh queues,
+        # squad totals and live boards catch up in bulk. New usernames without
+        # an account ID are looked up in the background by the refresh scheduler.
+        invalidation_bus.registrations_changed([
+            (row['discord_id'], row['previous_username'], row['epic_username'])
+            for row in imported
+            if row['previous_username'] is None or cache_key(row['previous_username']) != cache_key(row['epic_username'])
+        ])
+        unresolved = sum(1 for row in imported if row['account_id'] is None)
+
+        message = f"Imported {len(imported):,} registration(s)"
+        if skipped:
+            message += f", skipped {skipped:,} invalid row(s)"
+        if unresolved:
+            message += f". {unresolved:,} account ID(s) will be looked up in the background"
+        await interaction.followup.send(message, ephemeral=True)
+    except Exception as e:
+        await interaction.followup.send(f"Import failed: {e}", ephemeral=True)
+
+@registrations_group.command(name='export', description='Download every registration as a CSV file')
+async def registrations_export(interaction: discord.Interaction):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("This command is only for the bot owner.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    try:
+        data = await db.export_registrations()
+        await interaction.followup.send(
+            file=discord.File(io.BytesIO(data), filename='registrations.csv'),
+            ephemeral=True
+        )
     except Exception as e:
-        await interaction.followup.send(f"Error: {e}")
+        await interaction.followup.send(f"Export failed: {e}", ephemeral=True)
+
+tree.add_command(registrations_group)
+
+debug_group = app_commands.Group(name='debug', description='Bot diagnostics (owner only)')
+
+@debug_group.command(name='profile', description='Sample the running bot and show the hottest functions')
+@app_commands.describe(seconds='How long to sample for (1-60)')
+async def debug_profile(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 60] = 10):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("This command is only for the bot owner.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    report = await profile(seconds)
+    # Stay under Discord's 2000 character message limit
+    await interaction.followup.send(f"```\n{report[:1900]}\n```", ephemeral=True)
+
+@debug_group.command(name='status', description='Show API health, budget and background refresh state')
+async def debug_status(interaction: discord.Interaction):
+    if not await is_owner(interaction.user):
+        await interaction.response.send_message("This command is only for the bot owner.", ephemeral=True)
+        return
+
+    api_status = api.status()
+    if api_status['degraded']:
+        state = f"DEGRADED ({api_status['reason']}), retrying in {format_age(api_status['retry_in'])}"
+    else:
+        state = "OK"
+    lines = [
+        f"Fortnite API:  {state}",
+        f"Budget left:   {api_status['remaining_budget']}/{api_status['hourly_budget']} this hour",
+        f"Cached stats:  {len(stats_cache.entries)}",
+        f"Tracked accts: {len(refresh_scheduler.accounts)} ({refresh_scheduler.fetches} background fetches)",
+        f"Live boards:   {len(live_leaderboards.boards)} ({live_leaderboards.edits} edits)",
+    ]
+    if db.pool is not None:
+        pool = db.pool_stats()
+        mode = "session" if pool['session_mode'] else "transaction"
+        lines.append(
+            f"DB pool:       {pool['size']}/{pool['max_size']} open, {pool['idle']} idle ({mode} mode), "
+            f"acquire wait p50 {pool['wait_p50_ms']:.1f}ms, p99 {pool['wait_p99_ms']:.1f}ms, max {pool['wait_max_ms']:.1f}ms"
+        )
+    if MONITOR_ENABLED:
+        loop = loop_monitor.stats()
+        lines.append(f"Event loop:    p50 {loop['p50_ms']:.1f}ms, p99 {loop['p99_ms']:.1f}ms, {loop['blocked']} block(s)")
+    await interaction.response.send_message("```\n" + "\n".join(lines) + "\n```", ephemeral=True)
+
+tree.add_command(debug_group)
 
-# Run the bot
-client.run(os.getenv('DISCORD_TOKEN'))
\ No newline at end of file
+# Run the bot (card workers and replay.py import this module without connecting)
+if __name__ == '__main__':
+    client.run(os.getenv('DISCORD_TOKEN'))
\ No newline at end of file
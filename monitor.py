@@ -0,0 +1,134 @@
+# monitor.py
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+# Opt-in: set LOOP_MONITOR=1 to watch the event loop
+MONITOR_ENABLED = os.getenv('LOOP_MONITOR', '').lower() in ('1', 'true', 'yes')
+# A callback holding the loop longer than this is reported (seconds)
+BLOCK_THRESHOLD = float(os.getenv('LOOP_BLOCK_THRESHOLD', '0.25'))
+# How often the heartbeat wakes up to measure lag (seconds)
+HEARTBEAT_INTERVAL = 0.1
+# How often lag statistics are logged (seconds)
+SUMMARY_INTERVAL = 300
+
+def command_on_stack(frame):
+    """Name of the slash command whose handler is on this stack, if any"""
+    while frame is not None:
+        interaction = frame.f_locals.get('interaction')
+        command = getattr(interaction, 'command', None)
+        if command is not None:
+            return command.qualified_name
+        frame = frame.f_back
+    return None
+
+def describe_frame(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class LoopMonitor:
+    """Measures event-loop lag and reports callbacks that block it.
+
+    A heartbeat task on the loop records when it last ran; a watchdog thread
+    notices when the heartbeat stalls and logs the loop thread's stack.
+    """
+    def __init__(self):
+        self.task = None
+        self.loop_thread_id = None
+        self.last_beat = time.monotonic()
+        self.reported_beat = None
+        self.lags = deque(maxlen=3000)
+        self.blocked_count = 0
+
+    def start(self):
+        if self.task is not None:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.task = asyncio.create_task(self.heartbeat())
+        threading.Thread(target=self.watch, name='loop-watchdog', daemon=True).start()
+        print(f"Event loop monitor started (threshold {BLOCK_THRESHOLD * 1000:.0f}ms)")
+
+    async def heartbeat(self):
+        last_summary = time.monotonic()
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            self.last_beat = time.monotonic()
+            self.lags.append(self.last_beat - start - HEARTBEAT_INTERVAL)
+
+            if self.last_beat - last_summary >= SUMMARY_INTERVAL:
+                last_summary = self.last_beat
+                stats = self.stats()
+                print(
+                    f"Event loop lag p50={stats['p50_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms "
+                    f"max={stats['max_ms']:.1f}ms, {stats['blocked']} blocking callback(s)"
+                )
+
+    def watch(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            beat = self.last_beat
+            stalled = time.monotonic() - beat
+            # Report each stall once, while it is still happening
+            if stalled < BLOCK_THRESHOLD or self.reported_beat == beat:
+                continue
+            self.reported_beat = beat
+            self.blocked_count += 1
+
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            command = command_on_stack(frame)
+            stack = ''.join(traceback.format_stack(frame, limit=8))
+            print(
+                f"Event loop blocked for {stalled * 1000:.0f}ms+"
+                f"{f' in /{command}' if command else ''}:\n{stack}"
+            )
+
+    def stats(self):
+        lags = sorted(self.lags) or [0.0]
+        return {
+            'p50_ms': lags[len(lags) // 2] * 1000,
+            'p99_ms': lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000,
+            'max_ms': lags[-1] * 1000,
+            'blocked': self.blocked_count,
+        }
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005):
+    """Sample a thread's stack for a while; returns (samples, self counts, total counts)"""
+    own = Counter()
+    total = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            samples += 1
+            own[describe_frame(frame)] += 1
+            seen = set()
+            while frame is not None:
+                seen.add(describe_frame(frame))
+                frame = frame.f_back
+            total.update(seen)
+        time.sleep(interval)
+
+    return samples, own, total
+
+async def profile(seconds: float, top: int = 15):
+    """Sampling profile of the event loop thread, formatted as a text table"""
+    samples, own, total = await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds)
+    if not samples:
+        return "No samples collected"
+
+    lines = [f"{samples} samples over {seconds}s", f"{'self%':>6} {'total%':>6}  function"]
+    for name, count in own.most_common(top):
+        lines.append(f"{count / samples * 100:6.1f} {total[name] / samples * 100:6.1f}  {name}")
+    return '\n'.join(lines)
+
+loop_monitor = LoopMonitor()
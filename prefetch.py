@@ -0,0 +1,74 @@
+# prefetch.py
+import asyncio
+import os
+import time
+from collections import defaultdict, deque
+from database import db
+from refresh import refresh_scheduler
+
+# How often the prefetcher wakes up (seconds)
+PREFETCH_INTERVAL = int(os.getenv('PREFETCH_INTERVAL', '300'))
+# Users who ran a command this recently count as active (seconds)
+ACTIVE_WINDOW = int(os.getenv('PREFETCH_ACTIVE_WINDOW', '7200'))
+# Extra refresh demand for likely-active users and for their squadmates
+ACTIVE_WEIGHT = float(os.getenv('PREFETCH_ACTIVE_WEIGHT', '10'))
+SQUAD_WEIGHT = float(os.getenv('PREFETCH_SQUAD_WEIGHT', '3'))
+
+class ActivityTracker:
+    """Remembers when each user runs commands"""
+    def __init__(self, history: int = 50):
+        self.access_times = defaultdict(lambda: deque(maxlen=history))
+
+    def record(self, discord_id: int, when: float = None):
+        self.access_times[discord_id].append(when if when is not None else time.time())
+
+    def likely_active(self, now: float = None):
+        """Users who were active recently or usually play around this hour"""
+        now = now if now is not None else time.time()
+        upcoming_hours = {time.gmtime(now).tm_hour, time.gmtime(now + 3600).tm_hour}
+
+        for discord_id, times in self.access_times.items():
+            if now - times[-1] < ACTIVE_WINDOW:
+                yield discord_id
+                continue
+
+            # Seen at this time of day on at least two different days
+            days = {int(t // 86400) for t in times if time.gmtime(t).tm_hour in upcoming_hours}
+            if len(days) >= 2:
+                yield discord_id
+
+class Prefetcher:
+    """Background task that raises refresh demand for users likely to query soon"""
+    def __init__(self):
+        self.task = None
+
+    def start(self):
+        # on_ready can fire again after reconnects, only run one loop
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(PREFETCH_INTERVAL)
+            try:
+                await self.prefetch_once()
+            except Exception as e:
+                print(f"Prefetch failed: {e}")
+
+    async def prefetch_once(self):
+        active = list(activity.likely_active())
+        if not active or db.pool is None:
+            return
+
+        # Active users plus everyone in a squad with one of them. The refresh
+        # scheduler spends the budget; boosts last until the next pass.
+        players = await db.get_prefetch_players(active)
+        for player in players:
+            if player['active']:
+                source, weight = 'active', ACTIVE_WEIGHT
+            else:
+                source, weight = 'squad', SQUAD_WEIGHT
+            refresh_scheduler.boost(player['epic_username'], player['account_id'], source, weight, PREFETCH_INTERVAL * 2)
+
+activity = ActivityTracker()
+prefetcher = Prefetcher()
@@ -0,0 +1,173 @@
+# presentation.py
+import os
+import time
+from collections import OrderedDict
+import discord
+from fortnite_api import api
+from stats_cache import WINDOW_LABELS, cache_key
+
+# Formatted stats embeds kept for reuse while a player's stats are unchanged
+EMBED_CACHE_SIZE = int(os.getenv('EMBED_CACHE_SIZE', '500'))
+
+# Placement fields shown for each mode, besides the common ones
+PLACEMENT_FIELDS = {
+    'solo': [("Top 10", 'top10'), ("Top 25", 'top25')],
+    'duo': [("Top 5", 'top5'), ("Top 12", 'top12')],
+    'trio': [("Top 3", 'top3'), ("Top 6", 'top6')],
+    'squad': [("Top 3", 'top3'), ("Top 6", 'top6')],
+}
+
+def format_age(seconds: float):
+    """Short age like 45s, 12m, 3h or 2d"""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{int(seconds // size)}{unit}"
+    return f"{int(seconds)}s"
+
+def mark_stale(embed: discord.Embed, fetched_at: float):
+    """Add the age of cached stats to an embed's footer when they are past their TTL"""
+    note = f"⚠️ Cached stats from {format_age(time.time() - fetched_at)} ago"
+    if api.is_degraded:
+        note += " (Fortnite API unavailable)"
+    footer = embed.footer.text
+    embed.set_footer(text=f"{footer} • {note}" if footer else note)
+    return embed
+
+def render_stats_parts(player, mode: str, registered_as: str = None):
+    """Formatted parts of one player's stats embed in one mode, as an immutable tuple.
+
+    With registered_as the embed is worded for the player themselves (/me).
+    """
+    name = player.account.get('name')
+
+    # Create appropriate embed based on mode
+    if mode == 'all':
+        # Show overall stats
+        overall_stats = player.mode('overall')
+        embed = discord.Embed(
+            title="📊 Your Overall Stats" if registered_as else f"{name}'s Overall Stats",
+            color=discord.Color.blue()
+        )
+
+        if overall_stats:
+            embed.add_field(name="Total Wins", value=f"{overall_stats.get('wins', 0):,}", inline=True)
+            embed.add_field(name="K/D", value=f"{overall_stats.get('kd', 0):.2f}", inline=True)
+            embed.add_field(name="Win Rate", value=f"{overall_stats.get('winRate', 0):.0f}%", inline=True)
+            embed.add_field(name="Kills", value=f"{overall_stats.get('kills', 0):,}", inline=True)
+            embed.add_field(name="Matches", value=f"{overall_stats.get('matches', 0):,}", inline=True)
+            embed.add_field(name="Hours Played", value=f"{overall_stats.get('minutesPlayed', 0) // 60:,}", inline=True)
+        else:
+            embed.description = "Stats are private or unavailable"
+    else:
+        # Show specific mode stats
+        mode_stats = player.mode(mode)
+        mode_display = mode.capitalize()
+        embed = discord.Embed(
+            title=f"🎮 Your {mode_display} Stats" if registered_as else f"{name}'s {mode_display} Stats",
+            color=discord.Color.purple()
+        )
+
+        if mode_stats:
+            embed.add_field(name="Wins", value=f"{mode_stats.get('wins', 0):,}", inline=True)
+            embed.add_field(name="K/D", value=f"{mode_stats.get('kd', 0):.2f}", inline=True)
+            embed.add_field(name="Win Rate", value=f"{mode_stats.get('winRate', 0):.0f}%", inline=True)
+            embed.add_field(name="Kills", value=f"{mode_stats.get('kills', 0):,}", inline=True)
+            embed.add_field(name="Deaths", value=f"{mode_stats.get('deaths', 0):,}", inline=True)
+            embed.add_field(name="Matches", value=f"{mode_stats.get('matches', 0):,}", inline=True)
+
+            # Add placement stats based on mode
+            for label, field in PLACEMENT_FIELDS.get(mode, []):
+                embed.add_field(name=label, value=f"{mode_stats.get(field, 0):,}", inline=True)
+
+            embed.add_field(name="Avg Kills/Match", value=f"{mode_stats.get('killsPerMatch', 0):.1f}", inline=True)
+        else:
+            embed.description = f"No {mode_display} stats available"
+
+    window_label = f"{WINDOW_LABELS[player.time_window]} stats"
+    embed.set_footer(text=f"Registered as: {registered_as} • {window_label}" if registered_as else window_label)
+    fields = tuple((field.name, field.value, field.inline) for field in embed.fields)
+    return embed.title, embed.color.value, embed.description, fields, embed.footer.text
+
+def build_stats_embed(parts: tuple):
+    """A new Embed from formatted parts, with no formatting left to do"""
+    title, color, description, fields, footer = parts
+    embed = discord.Embed(title=title, color=color, description=description)
+    for name, value, inline in fields:
+        embed.add_field(name=name, value=value, inline=inline)
+    embed.set_footer(text=footer)
+    return embed
+
+def build_leaderboard_embed(guild: discord.Guild, leaderboard_data: list, stat: str, mode: str, window: str, refreshing: int = 0):
+    """Leaderboard embed; stale entries are marked while fresh data is fetched"""
+    # Create embed
+    embed = discord.Embed(
+        title=f"🏆 Server Leaderboard",
+        description=f"**Sorted by:** {stat.upper()} | **Mode:** {mode.capitalize()} | **Window:** {WINDOW_LABELS[window]}",
+        color=discord.Color.gold()
+    )
+
+    # Display top 10 with ALL stats
+    for i, player in enumerate(leaderboard_data, 1):
+        # Try to get member name
+        member = guild.get_member(player['discord_id'])
+        display_name = member.display_name if member else player['username']
+
+        # Medals for top 3
+        medal = "🥇 " if i == 1 else "🥈 " if i == 2 else "🥉 " if i == 3 else ""
+        freshness = "" if player['fresh'] else " ⏳"
+
+        # Format all stats for display
+        stats_text = (
+            f"**Wins:** {player['wins']:,} | "
+            f"**K/D:** {player['kd']:.2f} | "
+            f"**WR:** {player['winrate']:.0f}% | "
+            f"**Kills:** {player['kills']:,}"
+        )
+
+        embed.add_field(
+            name=f"{medal}#{i} {display_name}{freshness}",
+            value=stats_text,
+            inline=False
+        )
+
+    footer = f"Showing top {len(leaderboard_data)} players • Sorted by {stat.upper()}"
+    stale = [player for player in leaderboard_data if not player['fresh']]
+    if stale and api.is_degraded:
+        oldest = min(player['fetched_at'] for player in stale)
+        footer += f" • ⚠️ Fortnite API unavailable, ⏳ stats up to {format_age(time.time() - oldest)} old"
+    elif refreshing:
+        footer += f" • Updating {refreshing} player(s) ⏳"
+    elif stale:
+        footer += " • ⏳ = cached stats"
+    embed.set_footer(text=footer)
+    return embed
+
+class EmbedCache:
+    """Formatted stats embed parts memoized by (account, mode, window, stats fingerprint)"""
+    def __init__(self, size: int = EMBED_CACHE_SIZE):
+        self.size = size
+        self.parts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def stats_embed(self, player, mode: str, registered_as: str = None):
+        """A fresh Embed for the player's stats; callers may modify it freely"""
+        account = player.account.get('id') or cache_key(player.username)
+        key = (account, mode, player.time_window, player.fingerprint, registered_as)
+        parts = self.parts.get(key)
+        if parts is None:
+            self.misses += 1
+            parts = self.parts[key] = render_stats_parts(player, mode, registered_as)
+            if len(self.parts) > self.size:
+                self.parts.popitem(last=False)
+        else:
+            self.hits += 1
+            self.parts.move_to_end(key)
+        # The parts are immutable, so footers added by one caller can't leak into the next
+        return build_stats_embed(parts)
+
+embed_cache = EmbedCache()
+
+def stats_embed(player, mode: str, registered_as: str = None):
+    """Embed for /stats, or for /me when registered_as is the caller's Epic username"""
+    return embed_cache.stats_embed(player, mode, registered_as)
@@ -0,0 +1,235 @@
+# refresh.py
+import asyncio
+import os
+import time
+from collections import Counter
+from database import db
+from fortnite_api import api, HOURLY_BUDGET, INTERACTIVE_RESERVE, PRIORITY_LOW
+from invalidation import invalidation_bus
+from live_leaderboard import live_leaderboards
+from stats_cache import stats_cache, cache_key, WINDOW_TTLS
+
+# Refresh stats once they are this far through their window's TTL
+REFRESH_FRACTION = float(os.getenv('REFRESH_FRACTION', '0.5'))
+# How often registrations and squads are re-read for baseline demand (seconds)
+DEMAND_RELOAD_INTERVAL = int(os.getenv('REFRESH_DEMAND_RELOAD', '600'))
+# Background fetches are spread evenly over the hour within the budget
+# left over after the command reserve
+BACKGROUND_BUDGET = HOURLY_BUDGET * (1 - INTERACTIVE_RESERVE)
+FETCH_INTERVAL = 3600 / max(BACKGROUND_BUDGET, 1)
+# Extra demand for stats served stale while the API was degraded, so they are
+# refreshed first once budget returns
+STALE_WEIGHT = float(os.getenv('REFRESH_STALE_WEIGHT', '20'))
+# Extra demand for registrations whose account ID still has to be looked up
+RESOLVE_WEIGHT = float(os.getenv('REFRESH_RESOLVE_WEIGHT', '5'))
+# Windows other than lifetime are only refreshed in the background for players
+# whose stats in that window were asked for within this long (seconds)
+WINDOW_INTEREST = int(os.getenv('REFRESH_WINDOW_INTEREST', '86400'))
+# Staleness stops raising priority past this many TTLs, so a window with a
+# short TTL can't outrank every other window just by expiring often
+MAX_STALENESS = 2.0
+
+def account_key(username: str, account_id: str = None):
+    """Epic accounts are keyed by ID when known, otherwise by username"""
+    return account_id or f"name:{cache_key(username)}"
+
+class TrackedAccount:
+    """One distinct Epic account and how much the bot's users care about it"""
+    def __init__(self, username: str, account_id: str = None):
+        self.username = username
+        self.account_id = account_id
+        self.base_demand = 0  # registrations plus squad memberships, across all guilds
+        self.boosts = {}      # source -> (weight, expires_at)
+        self.retry_at = {}    # window -> time a failed lookup may be retried
+        self.unresolved = False  # registrations still need this account's ID stored
+
+    def demand(self, now: float):
+        self.boosts = {source: boost for source, boost in self.boosts.items() if boost[1] > now}
+        return self.base_demand + sum(weight for weight, _ in self.boosts.values())
+
+class RefreshScheduler:
+    """One queue of distinct Epic accounts, refreshed by staleness times demand.
+
+    Every registration, squad membership and active user adds demand to the
+    account they point at, so an account tracked by many guilds still costs
+    one fetch per refresh.
+    """
+    def __init__(self):
+        self.accounts = {}
+        self.interest = {}  # (lookup key, or None for every registered player, window) -> last asked for
+        self.task = None
+        self.last_reload = 0
+        self.fetches = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def track(self, username: str, account_id: str = None):
+        """Get or create the entry for an account"""
+        key = account_key(username, account_id)
+        account = self.accounts.get(key)
+        if account_id:
+            # Now that the ID is known, fold in any entry keyed by name
+            named = self.accounts.pop(account_key(username), None)
+            if named is not None and account is None:
+                named.account_id = account_id
+                account = self.accounts[key] = named
+            elif named is not None:
+                account.boosts.update(named.boosts)
+                account.unresolved = account.unresolved or named.unresolved
+        if account is None:
+            account = self.accounts[key] = TrackedAccount(username, account_id)
+        return account
+
+    def boost(self, username: str, account_id: str, source: str, weight: float, duration: float):
+        """Temporarily raise an account's demand, e.g. while its owner is active"""
+        account = self.track(username, account_id)
+        account.boosts[source] = (weight, time.time() + duration)
+
+    def resolve(self, username: str):
+        """Queue a lookup that stores the account ID of a registration made without one"""
+        account = self.track(username)
+        account.unresolved = True
+        account.boosts['resolve'] = (RESOLVE_WEIGHT, time.time() + 86400)
+
+    def forget(self, usernames: list):
+        """Drop one registration's demand per username, and accounts once nothing wants them"""
+        if not usernames:
+            return
+        now = time.time()
+        removed = Counter(cache_key(username) for username in usernames)
+        for key, account in list(self.accounts.items()):
+            count = removed.get(cache_key(account.username))
+            if count:
+                account.base_demand = max(0, account.base_demand - count)
+                if not account.base_demand:
+                    # No registration left to store an account ID on
+                    account.unresolved = False
+                    account.boosts.pop('resolve', None)
+                if not account.demand(now):
+                    del self.accounts[key]
+
+    def note_interest(self, username: str, time_window: str, now: float):
+        if time_window != 'lifetime':
+            self.interest[(username and cache_key(username), time_window)] = now
+
+    def wants(self, account: TrackedAccount, time_window: str, now: float):
+        """Whether anyone asked for this account's stats in the window recently"""
+        if time_window == 'lifetime':
+            return True
+        since = now - WINDOW_INTEREST
+        if account.base_demand and self.interest.get((None, time_window), 0) > since:
+            return True
+        return self.interest.get((cache_key(account.username), time_window), 0) > since
+
+    async def reload_demand(self):
+        """Baseline demand: one per registration plus one per squad membership"""
+        base = {}
+        for row in await db.get_refresh_demand():
+            account = self.track(row['epic_username'], row['account_id'])
+            base[id(account)] = base.get(id(account), 0) + 1 + row['squad_count']
+            if row['account_id'] is None:
+                account.unresolved = True
+
+        now = time.time()
+        for account in self.accounts.values():
+            account.base_demand = base.get(id(account), 0)
+        # Forget accounts nobody registers or looks at any more
+        self.accounts = {key: account for key, account in self.accounts.items() if account.demand(now) > 0}
+
+        # Live boards keep asking for their window even when nothing changes
+        for board in live_leaderboards.boards.values():
+            self.note_interest(None, board['time_window'], now)
+        self.interest = {key: asked for key, asked in self.interest.items() if asked > now - WINDOW_INTEREST}
+
+    def next_due(self, now: float):
+        """The most urgent (account, window) pair that is due for a refresh"""
+        best = None
+        best_priority = 0
+        for account in self.accounts.values():
+            demand = account.demand(now)
+            if not demand:
+                continue
+            for window, ttl in WINDOW_TTLS.items():
+                if account.retry_at.get(window, 0) > now or not self.wants(account, window, now):
+                    continue
+                entry = stats_cache.get(account.username, window)
+                # Never fetched counts as stale as the longest expired entry
+                staleness = min((now - entry.fetched_at) / ttl, MAX_STALENESS) if entry else MAX_STALENESS
+                if staleness < REFRESH_FRACTION:
+                    continue
+                priority = demand * staleness
+                if priority > best_priority:
+                    best = (account, window)
+                    best_priority = priority
+        return best
+
+    async def store_account_id(self, account: TrackedAccount, account_id: str):
+        """Save a looked-up account ID on the registrations that were missing it"""
+        if account.unresolved and db.pool is not None:
+            await db.set_account_id(account.username, account_id)
+            account.unresolved = False
+            account.boosts.pop('resolve', None)
+        self.track(account.username, account_id)
+
+    async def run(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"Refresh scheduler error: {e}")
+            await asyncio.sleep(FETCH_INTERVAL)
+
+    async def tick(self):
+        now = time.time()
+        if db.pool is not None and now - self.last_reload >= DEMAND_RELOAD_INTERVAL:
+            self.last_reload = now
+            await self.reload_demand()
+
+        # Registrations whose account ID is already known from cached stats
+        for account in [account for account in self.accounts.values() if account.unresolved]:
+            entry = stats_cache.get(account.username)
+            if entry and entry.account.get('id'):
+                await self.store_account_id(account, entry.account['id'])
+
+        if not api.has_spare_budget():
+            return
+        due = self.next_due(now)
+        if due is None:
+            return
+
+        account, window = due
+        ttl = WINDOW_TTLS[window]
+        player = await stats_cache.fetch(account.username, window, priority=PRIORITY_LOW, max_age=ttl * REFRESH_FRACTION)
+        self.fetches += 1
+        if player is None:
+            # Private or renamed accounts wait a full TTL before the next try;
+            # lookups lost to an API outage are retried once it recovers
+            if not api.is_degraded:
+                account.retry_at[window] = now + ttl
+        elif player.account.get('id'):
+            await self.store_account_id(account, player.account['id'])
+
+refresh_scheduler = RefreshScheduler()
+
+@invalidation_bus.on_registration_change
+def reschedule_registration(changes):
+    renamed = [
+        (old_username, new_username)
+        for discord_id, old_username, new_username in changes
+        if not (old_username and new_username and cache_key(old_username) == cache_key(new_username))
+    ]
+    refresh_scheduler.forget([old_username for old_username, _ in renamed if old_username])
+    for _, new_username in renamed:
+        if new_username:
+            # Look up (and store) the new account ID in the background
+            refresh_scheduler.resolve(new_username)
+
+@stats_cache.on_requested
+def note_window_interest(username, time_window):
+    refresh_scheduler.note_interest(username, time_window, time.time())
+
+@stats_cache.on_stale_served
+def queue_stale_refresh(player):
+    refresh_scheduler.boost(player.username, player.account.get('id'), 'stale', STALE_WEIGHT, 3600)
@@ -0,0 +1,283 @@
+# replay.py
+"""Replay a recorded command trace against the bot's handlers.
+
+Record a trace by running the bot with COMMAND_TRACE_FILE=commands.jsonl,
+then replay it against a local Postgres and a local fake Fortnite API:
+
+    DATABASE_URL=postgresql://localhost/fortnite_bot python replay.py commands.jsonl --speed 10
+
+Nothing talks to Discord or the real Fortnite API. Prints latency
+percentiles per command, API call totals and database pool saturation.
+With TRACE_SPANS_FILE set, each replayed command is traced for trace_report.py.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from aiohttp import web
+
+parser = argparse.ArgumentParser(description='Replay a recorded command trace against the bot')
+parser.add_argument('trace', help='JSONL file written with COMMAND_TRACE_FILE')
+parser.add_argument('--speed', type=float, default=1.0, help='Replay speed multiplier (1 = recorded pace)')
+parser.add_argument('--api-port', type=int, default=8765, help='Port for the fake Fortnite API')
+parser.add_argument('--api-latency', type=float, default=0.3, help='Seconds the fake API takes per request')
+parser.add_argument('--discord-latency', type=float, default=0.05, help='Seconds each simulated Discord response takes')
+parser.add_argument('--register-all', action='store_true', help='Register every traced user under a synthetic Epic username first')
+parser.add_argument('--no-admission', action='store_true', help="Don't apply the per-user and per-guild cooldowns")
+parser.add_argument('--no-background', action='store_true', help="Don't run the refresh scheduler and squad totals during the replay")
+args = parser.parse_args()
+
+if not os.getenv('DATABASE_URL'):
+    sys.exit("Set DATABASE_URL to a local Postgres database to replay against")
+
+# Point the bot at the fake API before its modules read the setting
+os.environ['FORTNITE_API_URL'] = f"http://127.0.0.1:{args.api_port}/v2/stats/br/v2"
+
+import discord
+import main
+from admission import admission
+from database import db
+from fortnite_api import api
+from invalidation import invalidation_bus
+from refresh import refresh_scheduler
+from squad_totals import squad_totals
+from stats_cache import stats_cache, cache_key
+from tracing import tracer
+
+# Commands that need the bot owner, a real attachment or a real channel can't be replayed
+SKIPPED_COMMANDS = ('debug', 'registrations', 'live_leaderboard')
+
+def fake_stats(name: str, time_window: str):
+    """Deterministic stats payload for any username"""
+    seed = int(hashlib.blake2b(f"{name.lower()}:{time_window}".encode(), digest_size=8).hexdigest(), 16)
+    scale = 1 if time_window == 'season' else 20
+    modes = {}
+    for i, mode in enumerate(['overall', 'solo', 'duo', 'trio', 'squad']):
+        matches = (seed >> (i * 8)) % 200 * scale + 10
+        wins = matches * ((seed >> (i * 4)) % 15) // 100
+        kills = matches * ((seed >> (i * 5)) % 40) // 10
+        deaths = max(matches - wins, 1)
+        modes[mode] = {
+            'wins': wins, 'kills': kills, 'deaths': deaths, 'matches': matches,
+            'kd': kills / deaths, 'winRate': wins * 100 / matches, 'killsPerMatch': kills / matches,
+            'minutesPlayed': matches * 15, 'top3': wins * 3, 'top5': wins * 4, 'top6': wins * 5,
+            'top10': wins * 6, 'top12': wins * 7, 'top25': wins * 10,
+        }
+    account_id = hashlib.blake2b(name.lower().encode(), digest_size=16).hexdigest()
+    return {'status': 200, 'data': {'account': {'id': account_id, 'name': name}, 'stats': {'all': modes}}}
+
+class FakeFortniteAPI:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+
+    async def stats(self, request: web.Request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return web.json_response(fake_stats(request.query.get('name', ''), request.query.get('timeWindow', 'lifetime')))
+
+    async def start(self, port: int):
+        app = web.Application()
+        app.router.add_get('/v2/stats/br/v2', self.stats)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        return runner
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+        self.display_name = f"user{user_id % 10000}"
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+    def get_member(self, member_id: int):
+        return None
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+        await self.interaction.reply()
+
+    async def defer(self, *args, **kwargs):
+        self.done = True
+        await self.interaction.reply()
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, *args, **kwargs):
+        await self.interaction.reply()
+
+class FakeInteraction:
+    """Just enough of discord.Interaction for the command handlers"""
+    type = discord.InteractionType.application_command
+
+    def __init__(self, command, user_id: int, guild_id: int):
+        self.command = command
+        self.user = FakeUser(user_id)
+        self.guild = FakeGuild(guild_id)
+        self.guild_id = guild_id
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.started = time.perf_counter()
+        self.first_reply = None
+        self.last_reply = None
+
+    async def reply(self):
+        # Simulated round trip to Discord
+        await asyncio.sleep(args.discord_latency)
+        now = time.perf_counter()
+        if self.first_reply is None:
+            self.first_reply = now
+        self.last_reply = now
+
+    async def edit_original_response(self, *args, **kwargs):
+        await self.reply()
+
+def find_command(name: str):
+    command = None
+    for part in name.split():
+        command = main.tree.get_command(part) if command is None else command.get_command(part)
+        if command is None:
+            return None
+    return command
+
+def percentile(values: list, fraction: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+class PoolSampler:
+    """Peak number of pool connections in use during the replay"""
+    def __init__(self):
+        self.peak_in_use = 0
+
+    async def run(self):
+        while True:
+            self.peak_in_use = max(self.peak_in_use, db.pool.get_size() - db.pool.get_idle_size())
+            await asyncio.sleep(0.01)
+
+async def run_event(event: dict, results: dict, counts: dict):
+    command = find_command(event['command'])
+    if command is None or event['command'].split()[0] in SKIPPED_COMMANDS:
+        counts['skipped'] += 1
+        return
+
+    interaction = FakeInteraction(command, event['user'], event['guild'] or 0)
+    try:
+        # Cooldowns apply as in the live bot, with refill rates scaled by --speed
+        if not args.no_admission and not await main.tree.interaction_check(interaction):
+            counts['throttled'] += 1
+            return
+        # Traced like live commands when TRACE_SPANS_FILE is set
+        with tracer.trace(f"/{event['command']}", command=event['command']):
+            await command.callback(interaction, **event['params'])
+    except Exception as e:
+        counts['errors'] += 1
+        print(f"/{event['command']} failed: {e!r}")
+        return
+    results.setdefault(event['command'], []).append(interaction)
+
+async def replay(events: list):
+    fake_api = FakeFortniteAPI(args.api_latency)
+    runner = await fake_api.start(args.api_port)
+
+    if not await db.connect():
+        sys.exit("Could not connect to DATABASE_URL")
+
+    # Registered before snapshots are loaded, so traced users' stats are kept
+    # as registered rather than competing for the unregistered LRU
+    if args.register_all:
+        users = {event['user'] for event in events}
+        imported = await db.import_registrations([(user, f"player_{user % 100000:05d}", None) for user in users])
+        # Published like /registrations import, so refresh queues and squad totals follow
+        invalidation_bus.registrations_changed([
+            (row['discord_id'], row['previous_username'], row['epic_username'])
+            for row in imported
+            if row['previous_username'] is None or cache_key(row['previous_username']) != cache_key(row['epic_username'])
+        ])
+        print(f"Registered {len(users)} traced user(s)")
+    await stats_cache.load_snapshots()
+
+    # Replayed traffic arrives --speed times faster, so buckets refill that much faster too
+    admission.limits = {
+        command: tuple((capacity, rate * args.speed) for capacity, rate in limits)
+        for command, limits in admission.limits.items()
+    }
+
+    if not args.no_background:
+        refresh_scheduler.start()
+        squad_totals.start()
+    sampler = PoolSampler()
+    sampler_task = asyncio.create_task(sampler.run())
+
+    results = {}
+    counts = {'skipped': 0, 'throttled': 0, 'errors': 0}
+    tasks = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    first_ts = events[0]['ts']
+    print(f"Replaying {len(events)} command(s) at {args.speed:g}x...")
+
+    for event in events:
+        delay = (event['ts'] - first_ts) / args.speed - (loop.time() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run_event(event, results, counts)))
+
+    await asyncio.gather(*tasks)
+    # Leaderboard refreshes keep editing their message in the background
+    if main.background_tasks:
+        await asyncio.gather(*main.background_tasks, return_exceptions=True)
+    elapsed = loop.time() - start
+
+    sampler_task.cancel()
+    report(results, counts, fake_api, sampler, elapsed)
+    await runner.cleanup()
+
+def report(results: dict, counts: dict, fake_api: FakeFortniteAPI, sampler: PoolSampler, elapsed: float):
+    print(f"\nReplayed in {elapsed:.1f}s")
+    print(f"{'command':<24}{'runs':>6}{'ack p50':>10}{'ack p99':>10}{'done p50':>10}{'done p99':>10}   (ms)")
+    for command, interactions in sorted(results.items()):
+        acks = [(i.first_reply - i.started) * 1000 for i in interactions if i.first_reply]
+        dones = [(i.last_reply - i.started) * 1000 for i in interactions if i.last_reply]
+        print(
+            f"{command:<24}{len(interactions):>6}"
+            f"{percentile(acks, 0.5):>10.0f}{percentile(acks, 0.99):>10.0f}"
+            f"{percentile(dones, 0.5):>10.0f}{percentile(dones, 0.99):>10.0f}"
+        )
+    print(f"\nSkipped {counts['skipped']}, throttled {counts['throttled']}, failed {counts['errors']}")
+
+    api_status = api.status()
+    print(f"Fortnite API requests: {fake_api.requests} ({api_status['hourly_budget'] - api_status['remaining_budget']} counted against the hourly budget)")
+
+    pool = db.pool_stats()
+    print(
+        f"DB pool: peak {sampler.peak_in_use}/{pool['max_size']} connections in use, {pool['acquires']} acquires, "
+        f"wait p50 {pool['wait_p50_ms']:.1f}ms, p99 {pool['wait_p99_ms']:.1f}ms, max {pool['wait_max_ms']:.1f}ms"
+    )
+
+def load_trace(path: str):
+    with open(path, encoding='utf-8') as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return sorted(events, key=lambda event: event['ts'])
+
+if __name__ == '__main__':
+    events = load_trace(args.trace)
+    if not events:
+        sys.exit("Trace is empty")
+    asyncio.run(replay(events))
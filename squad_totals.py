@@ -0,0 +1,85 @@
+# squad_totals.py
+import asyncio
+import os
+from database import db
+from invalidation import invalidation_bus
+from stats_cache import stats_cache, cache_key
+
+# How often changed player stats are folded into squad totals (seconds)
+FLUSH_INTERVAL = int(os.getenv('SQUAD_TOTALS_FLUSH_INTERVAL', '30'))
+
+class SquadTotals:
+    """Keeps the squad_totals table in step with squad membership and player stats.
+
+    Membership changes refresh their squad straight away. Stat changes are
+    collected and applied in one query per flush, after their snapshots are
+    written, since totals are summed from the stored snapshots.
+    """
+    def __init__(self):
+        self.changed_players = set()
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def mark_changed(self, username: str):
+        self.changed_players.add(cache_key(username))
+
+    async def refresh_squad(self, squad_id: int):
+        try:
+            await db.refresh_squad_totals([squad_id])
+        except Exception as e:
+            print(f"Failed to refresh totals for squad {squad_id}: {e}")
+
+    async def refresh_members(self, discord_ids: list):
+        """Refresh every squad the users are in, e.g. after their registrations change"""
+        try:
+            squad_ids = await db.get_member_squad_ids(discord_ids)
+            if squad_ids:
+                await db.refresh_squad_totals(squad_ids)
+        except Exception as e:
+            print(f"Failed to refresh squad totals for {len(discord_ids)} user(s): {e}")
+
+    async def rebuild(self):
+        """Recompute every squad's totals, e.g. after downtime or a bulk import"""
+        try:
+            await db.refresh_squad_totals()
+        except Exception as e:
+            print(f"Failed to rebuild squad totals: {e}")
+
+    async def run(self):
+        # Start from a full rebuild so totals are right after downtime
+        await self.rebuild()
+
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Squad totals flush failed: {e}")
+
+    async def flush(self):
+        if not self.changed_players or db.pool is None:
+            return
+        players, self.changed_players = list(self.changed_players), set()
+
+        # Totals are read from player_stats, so let pending snapshots land first
+        if stats_cache.pending_writes:
+            await asyncio.gather(*stats_cache.pending_writes, return_exceptions=True)
+
+        squad_ids = await db.get_player_squad_ids(players)
+        if squad_ids:
+            await db.refresh_squad_totals(squad_ids)
+
+squad_totals = SquadTotals()
+
+@stats_cache.on_change
+def queue_squad_totals(player):
+    squad_totals.mark_changed(player.username)
+
+@invalidation_bus.on_registration_change
+def refresh_registration_squads(changes):
+    # These users' squads now count different (or no) stats
+    if db.pool is not None:
+        return squad_totals.refresh_members([discord_id for discord_id, _, _ in changes])
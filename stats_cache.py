@@ -0,0 +1,316 @@
+# stats_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from database import db
+from fortnite_api import api, PRIORITY_HIGH
+from invalidation import invalidation_bus
+from tracing import tracer
+
+# How long fetched stats are served without asking the API again (seconds).
+# Lifetime totals barely move, season stats change with every match.
+WINDOW_TTLS = {
+    'lifetime': int(os.getenv('STATS_TTL_LIFETIME', '21600')),
+    'season': int(os.getenv('STATS_TTL_SEASON', '600')),
+}
+WINDOW_LABELS = {'lifetime': 'Lifetime', 'season': 'Season'}
+
+# Stats of players nobody registered (looked up with /stats) kept in memory;
+# the least recently used are dropped first. Registered players are always kept.
+UNREGISTERED_CACHE_SIZE = int(os.getenv('STATS_CACHE_UNREGISTERED', '1000'))
+# Stored snapshots of unregistered players are deleted after this long (seconds)
+SNAPSHOT_RETENTION = int(os.getenv('STATS_SNAPSHOT_RETENTION', '604800'))
+# How often old snapshots are pruned (seconds)
+PRUNE_INTERVAL = 3600
+
+def cache_key(username: str):
+    """Epic usernames are case-insensitive"""
+    return username.strip().lower()
+
+def stats_fingerprint(data: dict):
+    """Hash of a payload's stat values, ignoring bookkeeping like lastModified"""
+    all_stats = data.get('stats', {}).get('all') or {}
+    relevant = {
+        mode: {field: value for field, value in (block or {}).items() if field != 'lastModified'}
+        for mode, block in all_stats.items()
+    }
+    payload = json.dumps([data.get('account', {}).get('id'), relevant], sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+class PlayerStats:
+    """One player's stats payload for a time window and when it was fetched"""
+    def __init__(self, username: str, data: dict, fetched_at: float = None, time_window: str = 'lifetime'):
+        self.username = username
+        self.data = data
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        self.time_window = time_window
+        self._fingerprint = None
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = stats_fingerprint(self.data)
+        return self._fingerprint
+
+    @property
+    def account(self):
+        return self.data.get('account', {})
+
+    @property
+    def all_stats(self):
+        return self.data.get('stats', {}).get('all', {})
+
+    def mode(self, mode: str):
+        """Stats for one mode ('all' and 'overall' both mean the overall block)"""
+        return self.all_stats.get('overall' if mode == 'all' else mode, {})
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def is_fresh(self, max_age: float = None):
+        return self.age < (max_age if max_age is not None else WINDOW_TTLS[self.time_window])
+
+class StatsCache:
+    def __init__(self):
+        self.entries = {}
+        self.registered = Counter()  # lookup key -> users registered under it
+        self.unregistered = OrderedDict()  # keys of unregistered players' entries, least recently used first
+        self.last_prune = 0
+        self.in_flight = {}  # (lookup key, window) -> (task, priority) of running API requests
+        self.pending_writes = set()
+        self.listeners = []
+        self.refresh_listeners = []
+        self.stale_listeners = []
+        self.request_listeners = []
+
+    def on_change(self, listener):
+        """Call listener(entry) whenever a player's stats actually change"""
+        self.listeners.append(listener)
+        return listener
+
+    def on_refreshed(self, listener):
+        """Call listener(entry) when stale stats are fetched again and turn out unchanged"""
+        self.refresh_listeners.append(listener)
+        return listener
+
+    def on_stale_served(self, listener):
+        """Call listener(entry) whenever stale stats are served because the API is degraded"""
+        self.stale_listeners.append(listener)
+        return listener
+
+    def on_requested(self, listener):
+        """Call listener(username, time_window) when a user asks for stats; username is
+        None when a leaderboard asks for every registered player"""
+        self.request_listeners.append(listener)
+        return listener
+
+    def requested(self, username: str, time_window: str):
+        for listener in self.request_listeners:
+            try:
+                listener(username, time_window)
+            except Exception as e:
+                print(f"Stats request listener failed: {e}")
+
+    def get(self, username: str, time_window: str = 'lifetime'):
+        """Latest known stats for a player, however old"""
+        key = (cache_key(username), time_window)
+        entry = self.entries.get(key)
+        if entry is not None and key in self.unregistered:
+            self.unregistered.move_to_end(key)
+        return entry
+
+    def store(self, key: tuple, entry: PlayerStats):
+        """Keep an entry; unregistered players share a bounded LRU"""
+        self.entries[key] = entry
+        if not self.registered[key[0]]:
+            self.unregistered[key] = None
+            self.unregistered.move_to_end(key)
+            while len(self.unregistered) > UNREGISTERED_CACHE_SIZE:
+                oldest, _ = self.unregistered.popitem(last=False)
+                self.entries.pop(oldest, None)
+
+    def evict(self, username: str):
+        """Forget a player's stats in every window"""
+        key = cache_key(username)
+        for window in WINDOW_TTLS:
+            self.entries.pop((key, window), None)
+            self.unregistered.pop((key, window), None)
+
+    def register(self, username: str):
+        """Someone registered under username; keep their stats out of the LRU"""
+        key = cache_key(username)
+        self.registered[key] += 1
+        for window in WINDOW_TTLS:
+            self.unregistered.pop((key, window), None)
+
+    def unregister(self, username: str):
+        """A registration under username went away; once nobody is left, its stats can age out"""
+        key = cache_key(username)
+        self.registered[key] -= 1
+        if self.registered[key] > 0:
+            return
+        del self.registered[key]
+        for window in WINDOW_TTLS:
+            entry = self.entries.get((key, window))
+            if entry is not None:
+                self.store((key, window), entry)
+
+    def get_fresh(self, username: str, time_window: str = 'lifetime', max_age: float = None):
+        """Cached stats if they are still within the window's TTL (or max_age)"""
+        entry = self.get(username, time_window)
+        return entry if entry and entry.is_fresh(max_age) else None
+
+    def put(self, username: str, data: dict, time_window: str = 'lifetime'):
+        key = (cache_key(username), time_window)
+        entry = PlayerStats(username, data, time_window=time_window)
+        previous = self.entries.get(key)
+
+        # Same numbers as last time: just mark them fresh, nothing downstream changes
+        if previous is not None and previous.fingerprint == entry.fingerprint:
+            was_stale = not previous.is_fresh()
+            previous.fetched_at = entry.fetched_at
+            if was_stale:
+                for listener in self.refresh_listeners:
+                    try:
+                        listener(previous)
+                    except Exception as e:
+                        print(f"Stats refresh listener failed: {e}")
+            return previous
+
+        self.store(key, entry)
+
+        # Snapshot to the database without holding up the caller
+        if db.pool is not None:
+            task = asyncio.create_task(self.save_snapshot(entry))
+            self.pending_writes.add(task)
+            task.add_done_callback(self.pending_writes.discard)
+
+        for listener in self.listeners:
+            try:
+                listener(entry)
+            except Exception as e:
+                print(f"Stats change listener failed: {e}")
+        return entry
+
+    async def save_snapshot(self, entry: PlayerStats):
+        try:
+            await db.save_stats_snapshot(
+                cache_key(entry.username),
+                entry.time_window,
+                entry.account.get('id'),
+                entry.data,
+                datetime.fromtimestamp(entry.fetched_at, timezone.utc)
+            )
+        except Exception as e:
+            print(f"Failed to snapshot stats for {entry.username}: {e}")
+
+        # Lookups of players nobody registered would otherwise pile up forever
+        if time.time() - self.last_prune >= PRUNE_INTERVAL:
+            self.last_prune = time.time()
+            try:
+                pruned = await db.prune_stats_snapshots(SNAPSHOT_RETENTION)
+                if pruned:
+                    print(f"Pruned {pruned} old stats snapshot(s) of unregistered players")
+            except Exception as e:
+                print(f"Failed to prune stats snapshots: {e}")
+
+    async def load_snapshots(self):
+        """Warm the cache from stored snapshots after a restart.
+
+        Every registered player's snapshots are loaded, but only as many
+        unregistered ones as fit the unregistered LRU.
+        """
+        self.registered = Counter(await db.get_registration_counts())
+        loaded = 0
+        snapshots = await db.get_stats_snapshots(UNREGISTERED_CACHE_SIZE)
+        # Oldest first, so the most recent unregistered lookups are the last to be dropped
+        for snapshot in sorted(snapshots, key=lambda snapshot: snapshot['fetched_at']):
+            key = (snapshot['lookup_key'], snapshot['time_window'])
+            if snapshot['time_window'] not in WINDOW_TTLS:
+                continue
+            fetched_at = snapshot['fetched_at'].timestamp()
+            current = self.entries.get(key)
+            if current is None or current.fetched_at < fetched_at:
+                self.store(key, PlayerStats(key[0], snapshot['payload'], fetched_at, key[1]))
+                loaded += 1
+        return loaded
+
+    def serve_stale(self, username: str, time_window: str = 'lifetime'):
+        """Last known stats, however old, for when the API can't be asked"""
+        entry = self.get(username, time_window)
+        if entry is not None and not entry.is_fresh():
+            for listener in self.stale_listeners:
+                try:
+                    listener(entry)
+                except Exception as e:
+                    print(f"Stale stats listener failed: {e}")
+        return entry
+
+    def request(self, username: str, time_window: str, priority: int):
+        """The API request for a player and window, shared by everyone asking at once"""
+        key = (cache_key(username), time_window)
+        pending = self.in_flight.get(key)
+        # A background request may be skipped to save budget, so commands don't rely on one
+        if pending is not None and pending[1] <= priority:
+            return pending[0], True
+
+        task = asyncio.ensure_future(api.fetch_stats(username, time_window, priority=priority))
+        self.in_flight[key] = (task, priority)
+
+        def done(_):
+            if self.in_flight.get(key, (None,))[0] is task:
+                del self.in_flight[key]
+        task.add_done_callback(done)
+        return task, False
+
+    async def fetch(self, username: str, time_window: str = 'lifetime', priority: int = PRIORITY_HIGH, max_age: float = None):
+        """Return cached stats if fresh enough, otherwise fetch from the API.
+
+        In degraded mode the last known stats are returned instead, however old.
+        """
+        if priority == PRIORITY_HIGH:
+            self.requested(username, time_window)
+        with tracer.span('cache.fetch', time_window=time_window) as span:
+            entry = self.get_fresh(username, time_window, max_age)
+            if entry:
+                span.set(result='hit')
+                return entry
+
+            # Leaderboard refreshes, commands and the scheduler share one request per player
+            task, joined = self.request(username, time_window, priority)
+            span.set(joined=joined)
+            # A cancelled caller must not cancel the request others are waiting on
+            data = await asyncio.shield(task)
+            if data is None:
+                span.set(result='stale' if api.is_degraded else 'unavailable')
+                return self.serve_stale(username, time_window) if api.is_degraded else None
+            span.set(result='fetched')
+            return self.put(username, data, time_window)
+
+stats_cache = StatsCache()
+
+@invalidation_bus.on_registration_change
+def track_registration(changes):
+    for discord_id, old_username, new_username in changes:
+        if old_username is not None:
+            stats_cache.unregister(old_username)
+        if new_username is not None:
+            stats_cache.register(new_username)
+
+@invalidation_bus.on_registration_change
+def evict_old_registration(changes):
+    # Runs after track_registration, so names still registered by someone else are kept
+    old_keys = {
+        cache_key(old_username)
+        for discord_id, old_username, new_username in changes
+        if old_username is not None and not stats_cache.registered[cache_key(old_username)]
+    }
+    for key in old_keys:
+        stats_cache.evict(key)
+    if old_keys and db.pool is not None:
+        return db.delete_stats_snapshots(list(old_keys))
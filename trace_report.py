@@ -0,0 +1,105 @@
+# trace_report.py
+"""Summarize the spans written with TRACE_SPANS_FILE.
+
+    python trace_report.py spans.jsonl --slowest 5 --min-ms 2000
+
+Prints each slow interaction's critical path (the chain of spans that
+decided when it finished, with the time spent in each span itself) and,
+across all slow interactions, which kinds of span that time went to.
+"""
+import argparse
+import json
+from collections import defaultdict
+
+# Spans ending within this much of each other count as back to back (seconds)
+SLACK = 0.001
+
+def load_traces(path: str):
+    """trace_id -> list of spans, with start and end in seconds"""
+    traces = defaultdict(list)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            span = json.loads(line)
+            span['end'] = span['start'] + span['duration_ms'] / 1000
+            traces[span['trace_id']].append(span)
+    return traces
+
+def critical_path(span: dict, children: dict, depth: int = 0, path: list = None):
+    """(depth, span, self seconds) for every span on the critical path, in start order.
+
+    Walking back from the end of a span, the child that finished last was
+    being waited on; before it started, the child that finished last before
+    then was, and so on. Time not covered by such a child is the span's own.
+    """
+    path = [] if path is None else path
+    kids = sorted(children.get(span['span_id'], []), key=lambda child: child['end'], reverse=True)
+    # Background work started by the command can outlive its root span
+    cursor = max([span['end']] + [child['end'] for child in kids])
+
+    waited_on = []
+    for child in kids:
+        if child['end'] <= cursor + SLACK and child['start'] >= span['start'] - SLACK:
+            waited_on.append(child)
+            cursor = child['start']
+
+    covered = sum(child['end'] - child['start'] for child in waited_on)
+    entry = [depth, span, 0.0]
+    path.append(entry)
+    for child in reversed(waited_on):
+        critical_path(child, children, depth + 1, path)
+    entry[2] = max(0.0, max([span['end']] + [child['end'] for child in kids]) - span['start'] - covered)
+    return path
+
+def describe(span: dict):
+    attributes = {key: value for key, value in span['attributes'].items() if key not in ('command', 'interaction_id')}
+    details = ' '.join(f"{key}={value}" for key, value in attributes.items())
+    status = ' ERROR' if span['status'] == 'error' else ''
+    return f"{span['name']}{status} {details}".rstrip()
+
+def report(traces: dict, slowest: int, min_ms: float):
+    roots = []
+    for spans in traces.values():
+        root = next((span for span in spans if span['parent_id'] is None), None)
+        if root is None:
+            continue  # root span not written yet (still running, or crashed)
+        total = max(span['end'] for span in spans) - root['start']
+        roots.append((total, root, spans))
+
+    slow = sorted((trace for trace in roots if trace[0] * 1000 >= min_ms), key=lambda trace: trace[0], reverse=True)
+    print(f"{len(roots)} interaction(s) traced, {len(slow)} at or over {min_ms:g}ms")
+
+    by_name = defaultdict(float)
+    for n, (total, root, spans) in enumerate(slow):
+        children = defaultdict(list)
+        for span in spans:
+            if span['parent_id'] is not None:
+                children[span['parent_id']].append(span)
+        path = critical_path(root, children)
+        for depth, span, own in path:
+            by_name[span['name']] += own
+
+        if n >= slowest:
+            continue
+        print(f"\n{root['name']}  {total * 1000:.0f}ms  (trace {root['trace_id']}, {len(spans)} spans)")
+        print(f"{'start':>8}{'took':>8}{'self':>8}   (ms)")
+        for depth, span, own in path:
+            print(
+                f"{(span['start'] - root['start']) * 1000:>8.0f}{span['duration_ms']:>8.0f}{own * 1000:>8.0f}   "
+                f"{'  ' * depth}{describe(span)}"
+            )
+
+    if slow:
+        total_time = sum(trace[0] for trace in slow)
+        print(f"\nCritical path time by span, across {len(slow)} slow interaction(s):")
+        for name, seconds in sorted(by_name.items(), key=lambda item: item[1], reverse=True)[:15]:
+            print(f"{seconds * 1000:>10.0f}ms {seconds * 100 / total_time:>5.1f}%  {name}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show the critical path of slow traced interactions')
+    parser.add_argument('spans', help='JSONL file written with TRACE_SPANS_FILE')
+    parser.add_argument('--slowest', type=int, default=5, help='How many of the slowest interactions to print in full')
+    parser.add_argument('--min-ms', type=float, default=1000, help='Only interactions at least this slow (ms)')
+    args = parser.parse_args()
+    report(load_traces(args.spans), args.slowest, args.min_ms)
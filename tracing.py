@@ -0,0 +1,181 @@
+# tracing.py
+import contextvars
+import functools
+import json
+import os
+import re
+import secrets
+import time
+from contextlib import contextmanager, nullcontext
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Append finished spans of every traced interaction to this JSONL file (off
+# when unset). Summarize it with trace_report.py.
+SPANS_FILE = os.getenv('TRACE_SPANS_FILE')
+
+# Span of the interaction (or operation within it) the running code belongs to.
+# Tasks started inside a span inherit it, so background work stays in the trace.
+current_span = contextvars.ContextVar('current_span', default=None)
+
+class NullSpan:
+    """Stands in for a span when nothing is being traced"""
+    def set(self, **attributes):
+        pass
+
+NO_SPAN = nullcontext(NullSpan())
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start', 'started')
+
+    def __init__(self, trace_id: str, parent_id: str, name: str, attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.started = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+class Tracer:
+    """Per-interaction trace spans, written as one JSON line per finished span.
+
+    Spans are only recorded inside a trace, so background work that no
+    interaction started (refresh scheduler, squad totals) costs nothing.
+    """
+    def __init__(self, path: str = SPANS_FILE):
+        self.path = path
+        self.file = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def start(self, name: str, **attributes):
+        """Child of the current span, without making it current; None outside a trace"""
+        parent = current_span.get()
+        if parent is None:
+            return None
+        return Span(parent.trace_id, parent.span_id, name, attributes)
+
+    def finish(self, span: Span, error: BaseException = None):
+        if span is None:
+            return
+        self.export(span, time.perf_counter() - span.started, error)
+
+    def record(self, name: str, duration: float, **attributes):
+        """Span for something already timed, that ended just now"""
+        span = self.start(name, **attributes)
+        if span is not None:
+            span.start -= duration
+            self.export(span, duration)
+
+    def trace(self, name: str, **attributes):
+        """Root span with a new trace ID"""
+        if not self.enabled:
+            return NO_SPAN
+        return self.activate(Span(secrets.token_hex(16), None, name, attributes))
+
+    def span(self, name: str, **attributes):
+        """Nested span around a block; does nothing outside a trace"""
+        span = self.start(name, **attributes)
+        return NO_SPAN if span is None else self.activate(span)
+
+    @contextmanager
+    def activate(self, span: Span):
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            current_span.reset(token)
+            self.finish(span, e)
+            raise
+        current_span.reset(token)
+        self.finish(span)
+
+    def export(self, span: Span, duration: float, error: BaseException = None):
+        """Write a finished span; tracing problems are logged, never raised into commands"""
+        if not self.path:
+            return
+        try:
+            self.write(span, duration, error)
+        except Exception as e:
+            print(f"Failed to write trace span, tracing disabled: {e!r}")
+            self.path = None
+
+    def write(self, span: Span, duration: float, error: BaseException = None):
+        record = {
+            'trace_id': span.trace_id,
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'name': span.name,
+            'start': span.start,
+            'duration_ms': duration * 1000,
+            'status': 'error' if error is not None else 'ok',
+            'attributes': span.attributes,
+        }
+        if error is not None:
+            record['attributes'] = dict(span.attributes, error=repr(error))
+
+        if self.file is None:
+            # Line buffered so a crash loses at most the line being written
+            self.file = open(self.path, 'a', buffering=1, encoding='utf-8')
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+tracer = Tracer()
+
+def traced(kind: str):
+    """Decorator: run a coroutine function inside a '<kind>.<function name>' span"""
+    def decorator(func):
+        name = f"{kind}.{func.__name__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def discord_route(method: str, path: str):
+    """Span name for a Discord REST call, without IDs or interaction tokens"""
+    parts = path.split('/')
+    if 'interactions' in parts:
+        return 'discord.interaction_response'
+    if 'webhooks' in parts:
+        # Interaction followups and edits go through the application's webhook
+        if '@original' in parts:
+            return 'discord.edit_original_response' if method == 'PATCH' else f"discord.{method} original_response"
+        return 'discord.followup_send' if method == 'POST' else f"discord.{method} followup"
+    route = '/'.join('{id}' if part.isdigit() else part for part in parts[3:])
+    return f"discord.{method} /{route}"
+
+def http_trace_config():
+    """aiohttp hooks that add a span for every request made inside a trace"""
+    async def on_request_start(session, context, params):
+        url = params.url
+        if url.host and url.host.endswith('discord.com'):
+            name = discord_route(params.method, url.path)
+        else:
+            # Query strings are left out, they can hold player names
+            path = re.sub(r'/\d+', '/{id}', url.path)
+            name = f"http.{params.method} {url.host}{path}"
+        context.span = tracer.start(name)
+
+    async def on_request_end(session, context, params):
+        if context.span is not None:
+            context.span.set(status_code=params.response.status)
+        tracer.finish(context.span)
+
+    async def on_request_exception(session, context, params):
+        tracer.finish(context.span, params.exception)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config